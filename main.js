@@ -224,6 +224,11 @@ app.on('window-all-closed', () => {
   }
 });
 
+// 退出前关闭常驻翻译进程
+app.on('will-quit', () => {
+  translationService.stopTranslationServer();
+});
+
 
 
 // 游戏库管理相关的IPC处理
@@ -299,7 +304,7 @@ ipcMain.on('delete-game', (event, gameId) => {
 
 // 翻译相关的IPC处理
 // 翻译文本
-ipcMain.on('translate-text', async (event, text) => {
+ipcMain.on('translate-text', async (event, text, options = {}) => {
   try {
     log.info(`收到翻译请求: "${text}"`);
     
@@ -329,7 +334,17 @@ ipcMain.on('translate-text', async (event, text) => {
     // 模型已准备好，执行翻译
     log.info('开始翻译文本...');
     try {
-      const result = await translationService.translateText(text);
+      // 流式翻译：每译好一段就推送给渲染进程，完整结果仍通过translation-result发送
+      const onPartial = options && options.stream
+        ? (partial) => event.sender.send('translation-partial', {
+            index: partial.index,
+            start: partial.start,
+            end: partial.end,
+            paragraph: partial.paragraph,
+            translation: partial.translation
+          })
+        : null;
+      const result = await translationService.translateText(text, onPartial);
       log.info('翻译成功:', result);
       
       // 发送翻译结果到渲染进程
@@ -58,9 +58,12 @@ contextBridge.exposeInMainWorld('electronAPI', {
   removeGameInfoProgressListener: () => ipcRenderer.removeAllListeners('game-info-progress'),
   
   // 翻译功能
-  translateText: (text) => ipcRenderer.send('translate-text', text),
+  // options.stream为true时，翻译好的分段会先通过translation-partial逐段推送
+  translateText: (text, options) => ipcRenderer.send('translate-text', text, options),
   onTranslationResult: (callback) => ipcRenderer.on('translation-result', callback),
   removeTranslationResultListener: () => ipcRenderer.removeAllListeners('translation-result'),
+  onTranslationPartial: (callback) => ipcRenderer.on('translation-partial', callback),
+  removeTranslationPartialListener: () => ipcRenderer.removeAllListeners('translation-partial'),
   checkTranslationModel: () => ipcRenderer.invoke('check-translation-model'),
   onTranslationModelProgress: (callback) => ipcRenderer.on('translation-model-progress', callback),
   removeTranslationModelProgressListener: () => ipcRenderer.removeAllListeners('translation-model-progress'),
@@ -143,6 +146,7 @@ const allowedChannels = [
   'terminate-game-reply',
   'get-all-covers-reply',
   'translation-result',
+  'translation-partial',
   'translation-model-progress',
   'translation-model-status-update',
   'backup-data-reply',
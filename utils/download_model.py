@@ -3,9 +3,14 @@ import os
 import sys
 import json
 import time
+import random
 import shutil
+import hashlib
+import struct
+import zipfile
 import requests
-import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import logging
 
@@ -34,87 +39,634 @@ except ImportError:
     TRANSFORMERS_AVAILABLE = False
     logger.warning("找不到transformers或torch库，将使用直接下载方式")
 
-def report_progress(stage, model_name, percentage, message=""):
-    """向主进程报告下载进度"""
+# 下载参数
+HF_ENDPOINT = os.environ.get('HF_ENDPOINT', 'https://huggingface.co').rstrip('/')
+MAX_PARALLEL_FILES = 4                  # 同时下载的文件数
+RANGE_PARTS = 4                         # 大文件分段下载的段数
+RANGE_MIN_SIZE = 32 * 1024 * 1024       # 超过该大小且服务器支持Range时分段下载
+CHUNK_SIZE = 1024 * 1024                # 每次从网络读取的块大小
+WRITE_BUFFER_SIZE = 4 * 1024 * 1024     # 写文件缓冲区大小
+REQUEST_TIMEOUT = (10, 60)              # (连接超时, 读取超时) 秒
+STALL_TIMEOUT = float(os.environ.get('DOWNLOAD_STALL_TIMEOUT', '20'))  # 下载中超过该秒数没有数据视为卡顿，断开重连
+# 文件要按原始字节下载：服务器压缩传输时content-length和内容都与上游记录的大小、哈希对不上
+IDENTITY_ENCODING = {'Accept-Encoding': 'identity'}
+SPEED_SMOOTHING = 0.3                   # 下载速度指数平滑系数，越大越偏向最近的速度
+MAX_RETRIES = 5                         # 临时性错误的最大重试次数
+RETRY_BACKOFF = 1.0                     # 第一次重试前的等待秒数，之后每次翻倍
+RETRY_BACKOFF_MAX = 30                  # 单次重试等待的上限秒数
+MANIFEST_FILE = "download_manifest.json"  # 记录已下载文件大小和哈希的清单
+SAFETENSORS_MAX_HEADER = 100 * 1024 * 1024  # safetensors文件头长度上限
+
+# safetensors中各dtype每个元素的字节数
+SAFETENSORS_DTYPE_SIZES = {
+    'BOOL': 1, 'U8': 1, 'I8': 1, 'F8_E4M3': 1, 'F8_E5M2': 1,
+    'I16': 2, 'U16': 2, 'F16': 2, 'BF16': 2,
+    'I32': 4, 'U32': 4, 'F32': 4,
+    'I64': 8, 'U64': 8, 'F64': 8
+}
+
+_report_lock = threading.Lock()
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """所有下载共用的HTTP会话，复用连接池"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            pool_size = MAX_PARALLEL_FILES * RANGE_PARTS * 2
+            adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            _session = requests.Session()
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
+
+def report_progress(stage, model_name, percentage, message="", metrics=None):
+    """向主进程报告下载进度
+
+    metrics是可选的速度、剩余时间、重试次数等统计，见ProgressAggregator.metrics。
+    每条进度是完整的一行JSON，主进程按行解析，不需要等待。
+    """
     progress_info = {
         "stage": stage,
         "model": model_name,
         "percentage": percentage,
         "message": message
     }
-    # 确保中文字符正确输出
+    if metrics is not None:
+        progress_info["metrics"] = metrics
+    # 确保中文字符正确输出，多个下载线程同时报告时整行输出
     progress_json = json.dumps(progress_info, ensure_ascii=False)
-    print(progress_json, flush=True)
+    with _report_lock:
+        print(progress_json, flush=True)
     logger.info(f"进度更新: {stage} - {model_name} - {percentage}% - {message}")
-    # 添加短暂延迟确保输出被处理
-    time.sleep(0.1)
 
-def download_file(url, destination_path, model_name, file_desc="文件"):
-    """下载文件并报告进度"""
+class ProgressAggregator:
+    """汇总多个文件、多个分段的下载字节数，按整体进度调用report_progress
+
+    同时统计整体下载速度、剩余时间和重试次数，随进度一起报告。
+    """
+    
+    def __init__(self, model_name, total_bytes, start_percentage=0, end_percentage=100):
+        self.model_name = model_name
+        self.total_bytes = total_bytes
+        self.start_percentage = start_percentage
+        self.end_percentage = end_percentage
+        self.downloaded_bytes = 0
+        self.transferred_bytes = 0
+        self.retries = 0
+        self.stalls = 0
+        self.files = []
+        self._lock = threading.Lock()
+        self._last_report_time = 0
+        self._last_percentage = start_percentage
+        self._speed = None
+        self._speed_time = time.time()
+        self._speed_bytes = 0
+    
+    def register(self, file_progress):
+        with self._lock:
+            self.files.append(file_progress)
+        _telemetry.add(file_progress)
+    
+    def percentage(self):
+        if self.total_bytes <= 0:
+            return self.start_percentage
+        fraction = min(self.downloaded_bytes / self.total_bytes, 1.0)
+        return int(self.start_percentage + fraction * (self.end_percentage - self.start_percentage))
+    
+    def add(self, byte_count, transferred=True):
+        """记录下载的字节数；transferred为False表示续传时已有的字节，不计入速度"""
+        with self._lock:
+            self.downloaded_bytes += byte_count
+            if transferred and byte_count > 0:
+                self.transferred_bytes += byte_count
+            percentage = self.percentage()
+            current_time = time.time()
+            
+            # 每秒最多报告一次进度，或者进度变化超过5%
+            if not (current_time - self._last_report_time >= 1.0 or
+                    (percentage - self._last_percentage >= 5 and current_time - self._last_report_time >= 0.5)):
+                return
+            self._last_report_time = current_time
+            self._last_percentage = percentage
+            self._update_speed(current_time)
+            metrics = self.metrics()
+        
+        message = f"下载进度: {self.downloaded_bytes}/{self.total_bytes} 字节"
+        report_progress("downloading", self.model_name, percentage, message, metrics)
+    
+    def retry(self, error):
+        with self._lock:
+            self.retries += 1
+            if isinstance(error, StalledDownloadError):
+                self.stalls += 1
+    
+    def _update_speed(self, current_time):
+        # 按两次报告之间收到的字节数计算当前速度，再做指数平滑，避免剩余时间跳动
+        interval = current_time - self._speed_time
+        if interval <= 0:
+            return
+        speed = (self.transferred_bytes - self._speed_bytes) / interval
+        if self._speed is None:
+            self._speed = speed
+        else:
+            self._speed = SPEED_SMOOTHING * speed + (1 - SPEED_SMOOTHING) * self._speed
+        self._speed_time = current_time
+        self._speed_bytes = self.transferred_bytes
+    
+    def metrics(self):
+        """当前的整体速度(字节/秒)、预计剩余秒数、重试和卡顿次数，以及正在下载的各文件速度"""
+        speed = int(self._speed or 0)
+        remaining = max(self.total_bytes - self.downloaded_bytes, 0)
+        return {
+            "downloadedBytes": self.downloaded_bytes,
+            "totalBytes": self.total_bytes,
+            "bytesPerSec": speed,
+            "etaSeconds": int(remaining / speed) if speed else None,
+            "retries": self.retries,
+            "stalls": self.stalls,
+            "files": [file.metrics() for file in self.files if file.finished is None]
+        }
+    
+    def message(self, text):
+        with self._lock:
+            metrics = self.metrics()
+        report_progress("downloading", self.model_name, self.percentage(), text, metrics)
+
+class FileProgress:
+    """单个文件的下载统计，字节数同时计入所属的ProgressAggregator
+
+    区分本次从网络收到的字节和续传时已有的字节，速度只按前者计算。
+    """
+    
+    def __init__(self, aggregator, name, size):
+        self.aggregator = aggregator
+        self.name = name
+        self.size = size
+        self.downloaded = 0
+        self.transferred = 0
+        self.resumed = 0
+        self.retries = 0
+        self.stalls = 0
+        self.ok = None
+        self.started = time.time()
+        self.finished = None
+        self._lock = threading.Lock()
+        aggregator.register(self)
+    
+    def add(self, byte_count):
+        with self._lock:
+            self.downloaded += byte_count
+            if byte_count > 0:
+                self.transferred += byte_count
+        self.aggregator.add(byte_count)
+    
+    def add_resumed(self, byte_count):
+        with self._lock:
+            self.downloaded += byte_count
+            self.resumed += byte_count
+        self.aggregator.add(byte_count, transferred=False)
+    
+    def retry(self, error):
+        with self._lock:
+            self.retries += 1
+            if isinstance(error, StalledDownloadError):
+                self.stalls += 1
+        self.aggregator.retry(error)
+    
+    def message(self, text):
+        self.aggregator.message(text)
+    
+    def finish(self, ok):
+        self.ok = ok
+        self.finished = time.time()
+    
+    def elapsed(self):
+        return (self.finished or time.time()) - self.started
+    
+    def speed(self):
+        elapsed = self.elapsed()
+        return int(self.transferred / elapsed) if elapsed > 0 else 0
+    
+    def metrics(self):
+        return {
+            "name": self.name,
+            "downloadedBytes": self.downloaded,
+            "totalBytes": self.size,
+            "bytesPerSec": self.speed()
+        }
+    
+    def summary(self):
+        return {
+            "model": self.aggregator.model_name,
+            "name": self.name,
+            "size": self.size,
+            "bytes": self.transferred,
+            "resumedBytes": self.resumed,
+            "seconds": round(self.elapsed(), 3),
+            "bytesPerSec": self.speed(),
+            "retries": self.retries,
+            "stalls": self.stalls,
+            "ok": self.ok
+        }
+
+class DownloadTelemetry:
+    """整个下载过程的统计，结束时输出为JSON汇总，供安装程序记录和对比下载性能"""
+    
+    def __init__(self):
+        self.started = time.time()
+        self.files = []
+        self.skipped = 0
+        self._lock = threading.Lock()
+    
+    def add(self, file_progress):
+        with self._lock:
+            self.files.append(file_progress)
+    
+    def skip(self, count):
+        with self._lock:
+            self.skipped += count
+    
+    def summary(self):
+        with self._lock:
+            files = list(self.files)
+            skipped = self.skipped
+        wall_seconds = time.time() - self.started
+        transferred = sum(file.transferred for file in files)
+        return {
+            "wallSeconds": round(wall_seconds, 3),
+            "bytes": transferred,
+            "resumedBytes": sum(file.resumed for file in files),
+            "bytesPerSec": int(transferred / wall_seconds) if wall_seconds > 0 else 0,
+            "retries": sum(file.retries for file in files),
+            "stalls": sum(file.stalls for file in files),
+            "filesDownloaded": sum(1 for file in files if file.ok),
+            "filesFailed": sum(1 for file in files if not file.ok),
+            "filesSkipped": skipped,
+            "files": [file.summary() for file in files]
+        }
+
+_telemetry = DownloadTelemetry()
+
+class StreamHasher:
+    """边写文件边计算哈希，避免下载完成后再把文件读一遍
+
+    LFS文件按sha256校验，其他文件按git blob id（sha1("blob <size>\\0" + 内容)）校验。
+    """
+    
+    def __init__(self, size, sha256=None, blob_id=None):
+        self.size = size
+        if sha256:
+            self.algorithm, self.expected = 'sha256', sha256
+        else:
+            self.algorithm, self.expected = 'sha1', blob_id
+        self.reset()
+    
+    def reset(self):
+        self._digest = hashlib.new(self.algorithm)
+        if self.algorithm == 'sha1':
+            self._digest.update(f"blob {self.size}\0".encode('ascii'))
+    
+    def update(self, data):
+        self._digest.update(data)
+    
+    def update_from_file(self, file_path):
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(WRITE_BUFFER_SIZE), b''):
+                self._digest.update(chunk)
+    
+    def hexdigest(self):
+        return self._digest.hexdigest()
+    
+    def matches(self):
+        return self.hexdigest() == self.expected
+
+def _make_hasher(size, sha256=None, blob_id=None):
+    """有上游哈希时返回StreamHasher，否则返回None"""
+    if sha256 or blob_id:
+        return StreamHasher(size, sha256, blob_id)
+    return None
+
+class RetryableDownloadError(Exception):
+    """可以通过重试恢复的下载错误，例如连接中断导致内容不完整"""
+    pass
+
+class StalledDownloadError(RetryableDownloadError):
+    """下载连接超过STALL_TIMEOUT秒没有收到数据"""
+    pass
+
+def _is_retryable(error):
+    """判断错误是否是临时性的网络问题"""
+    if isinstance(error, requests.exceptions.HTTPError):
+        status = error.response.status_code if error.response is not None else 0
+        return status == 429 or status >= 500
+    return isinstance(error, (requests.exceptions.RequestException, RetryableDownloadError))
+
+def _with_retries(action, desc, on_retry=None):
+    """执行action，遇到临时性错误时按指数退避重试；每次重试前用错误调用on_retry"""
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return action()
+        except Exception as e:
+            if attempt >= MAX_RETRIES or not _is_retryable(e):
+                raise
+            if on_retry is not None:
+                on_retry(e)
+            delay = min(RETRY_BACKOFF * (2 ** attempt), RETRY_BACKOFF_MAX) * random.uniform(0.8, 1.2)
+            logger.warning(f"{desc}出错: {str(e)}，{delay:.1f}秒后进行第{attempt + 1}次重试")
+            time.sleep(delay)
+
+def _stream_to_file(response, file_path, progress, mode='wb', hasher=None, offset=None, checkpoint=None):
+    """把响应内容按块写入文件，返回写入的字节数；传入hasher时同时更新哈希
+
+    offset不为None时写到已有文件的该位置（分段下载的各段共用一个预分配的文件）。
+    checkpoint(written)在写入的内容已经交给操作系统后调用，用于记录续传进度。
+    连接超过STALL_TIMEOUT秒没有数据时抛出StalledDownloadError，已写入的内容保留，
+    由重试逻辑重新连接并从断点继续。
+    """
+    written = 0
+    saved = 0
+    last_data_time = time.time()
+    try:
+        with open(file_path, mode if offset is None else 'r+b', buffering=WRITE_BUFFER_SIZE) as f:
+            if offset is not None:
+                f.seek(offset)
+            try:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    if chunk:
+                        f.write(chunk)
+                        if hasher is not None:
+                            hasher.update(chunk)
+                        written += len(chunk)
+                        progress.add(len(chunk))
+                        last_data_time = time.time()
+                        if checkpoint is not None and written - saved >= WRITE_BUFFER_SIZE:
+                            f.flush()
+                            checkpoint(written)
+                            saved = written
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                # 读取超时设置为STALL_TIMEOUT，超时说明连接已卡住
+                if time.time() - last_data_time >= STALL_TIMEOUT:
+                    raise StalledDownloadError(f"{STALL_TIMEOUT:g}秒没有收到数据，重新连接") from e
+                raise
+    finally:
+        # 文件已关闭，缓冲区中的内容都已写出
+        if checkpoint is not None and written != saved:
+            checkpoint(written)
+    return written
+
+def _download_to_partial(url, partial_path, progress, start=0, end=None, etag=None, resume=True, hasher=None,
+                         have=None, checkpoint=None):
+    """下载[start, end]范围的内容到partial_path，已有内容时从断点继续
+
+    end为None表示一直到文件末尾。resume为False时（服务器不支持Range）总是重新下载。
+    hasher必须已经包含partial_path中现有的内容，从头下载时会被重置。
+    have为None时内容追加在partial_path末尾，已有的字节数就是文件大小；
+    分段下载时由调用方传入该段已有的字节数，内容写到partial_path中start + have处，
+    并用checkpoint(该段已有的字节数)记录进度。
+    返回该范围已下载的字节数。
+    """
+    offset_mode = have is not None
+    if not offset_mode:
+        have = os.path.getsize(partial_path) if resume and os.path.exists(partial_path) else 0
+    expected = None if end is None else end - start + 1
+    if expected is not None and have >= expected:
+        if have == expected:
+            return have
+        # 分段文件比预期还大，说明已损坏，重新下载
+        progress.add(-have)
+        have = 0
+    
+    headers = dict(IDENTITY_ENCODING)
+    if start + have > 0 or end is not None:
+        headers['Range'] = f"bytes={start + have}-{'' if end is None else end}"
+        # 远端文件已变化时服务器会返回完整内容而不是分段
+        if etag:
+            headers['If-Range'] = etag
+    
+    timeout = (REQUEST_TIMEOUT[0], STALL_TIMEOUT)
+    with get_session().get(url, headers=headers, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        mode = 'ab' if have else 'wb'
+        if 'Range' in headers and response.status_code != 206:
+            if start > 0 or end is not None:
+                raise Exception(f"服务器未返回分段内容 (状态码 {response.status_code})")
+            # 整个文件重新下载
+            logger.warning(f"服务器不支持续传，从头下载: {url}")
+            progress.add(-have)
+            have = 0
+            mode = 'wb'
+        if not have and hasher is not None:
+            hasher.reset()
+        if offset_mode:
+            written = _stream_to_file(response, partial_path, progress, hasher=hasher, offset=start + have,
+                                      checkpoint=checkpoint and (lambda written: checkpoint(have + written)))
+        else:
+            written = _stream_to_file(response, partial_path, progress, mode, hasher)
+    
+    total = have + written
+    if expected is not None and total != expected:
+        raise RetryableDownloadError(f"分段不完整: 预期 {expected} 字节, 实际 {total} 字节")
+    return total
+
+def _range_progress_path(partial_path):
+    return f"{partial_path}.ranges.json"
+
+def _read_range_progress(partial_path, part_count):
+    """分段下载时每段已经写入partial_path的字节数"""
+    try:
+        with open(_range_progress_path(partial_path), 'r', encoding='utf-8') as f:
+            done = json.load(f)
+    except (OSError, ValueError):
+        done = None
+    if (not os.path.exists(partial_path) or not isinstance(done, list) or len(done) != part_count
+            or not all(isinstance(count, int) and count >= 0 for count in done)):
+        return [0] * part_count
+    return done
+
+def _write_range_progress(partial_path, done):
+    progress_path = _range_progress_path(partial_path)
+    temp_path = f"{progress_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(done, f)
+    os.replace(temp_path, progress_path)
+
+def _download_in_ranges(url, partial_path, total_size, progress, etag=None, hasher=None):
+    """并发下载多个分段（每段单独续传和重试），各段直接写到partial_path中自己的偏移处
+
+    partial_path预先分配为完整大小，每段已写入的字节数记录在.partial.ranges.json中，
+    用于续传，不再需要把分段文件拼接一遍。分段是乱序到达的，所以哈希在全部完成后
+    按顺序读一遍partial_path计算：这一遍读取是有意保留的，换来的是不必缓存乱序的数据。
+    """
+    part_size = -(-total_size // RANGE_PARTS)
+    ranges = [(start, min(start + part_size, total_size) - 1) for start in range(0, total_size, part_size)]
+    done = _read_range_progress(partial_path, len(ranges))
+    done_lock = threading.Lock()
+    
+    with open(partial_path, 'r+b' if os.path.exists(partial_path) else 'wb') as f:
+        f.truncate(total_size)
+    
+    def record(i, count):
+        with done_lock:
+            done[i] = count
+            _write_range_progress(partial_path, done)
+    
+    def download_part(i, start, end):
+        return _with_retries(
+            lambda: _download_to_partial(url, partial_path, progress, start, end, etag, have=done[i],
+                                         checkpoint=lambda count: record(i, count)),
+            f"下载分段 {i + 1}/{len(ranges)}",
+            progress.retry
+        )
+    
+    with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+        futures = [executor.submit(download_part, i, start, end) for i, (start, end) in enumerate(ranges)]
+        for future in futures:
+            future.result()
+    
+    if hasher is not None:
+        hasher.update_from_file(partial_path)
+
+def _partial_files(destination_path):
+    """destination_path对应的所有未完成下载文件（.partial、分段进度和状态文件）"""
+    directory = os.path.dirname(destination_path)
+    prefix = os.path.basename(destination_path) + '.partial'
+    return [os.path.join(directory, name) for name in os.listdir(directory) if name.startswith(prefix)]
+
+def _prepare_partial_download(destination_path, url, etag, total_size, part_count):
+    """检查断点续传状态，返回已下载的字节数
+
+    状态文件记录了URL、ETag、大小和分段数，与远端不一致时丢弃旧的未完成文件。
+    """
+    partial_path = f"{destination_path}.partial"
+    state_path = f"{partial_path}.json"
+    state = {"url": url, "etag": etag, "size": total_size, "parts": part_count}
+    
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            previous_state = json.load(f)
+    except (OSError, ValueError):
+        previous_state = None
+    
+    if previous_state == state:
+        if part_count:
+            resumed = sum(_read_range_progress(partial_path, part_count))
+        else:
+            resumed = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+        if resumed:
+            logger.info(f"继续之前未完成的下载，已有 {resumed} 字节")
+        return resumed
+    
+    # 没有状态或远端文件已变化，从头开始
+    for path in _partial_files(destination_path):
+        os.unlink(path)
+    with open(state_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    return 0
+
+def download_file(url, destination_path, model_name, file_desc="文件", progress=None,
+                  sha256=None, blob_id=None, size=None):
+    """下载文件并报告进度
+
+    大文件在服务器支持Range时分成多段并发下载。progress是该文件的FileProgress，
+    同时下载多个文件时由调用方传入，字节数汇总到共享的ProgressAggregator；
+    不传时单独为该文件创建一个。
+
+    下载内容先写到目标旁边的.partial文件，并用.partial.json记录状态。
+    失败时保留这些文件，下次通过Range请求从断点继续；临时性错误会自动按指数退避重试。
+
+    传入sha256（LFS文件）或blob_id时，在写入的同时计算哈希并与上游比对，
+    不一致时丢弃下载内容。size是上游记录的文件大小，blob_id按它计算。
+    """
+    def finish(ok):
+        if progress is not None:
+            progress.finish(ok)
+        return ok
+    
     try:
         logger.info(f"开始下载{file_desc}: {url}")
         
         # 创建目录
         os.makedirs(os.path.dirname(destination_path), exist_ok=True)
         
-        # 发送请求
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        
-        # 获取文件总大小
-        total_size = int(response.headers.get('content-length', 0))
+        # 先用HEAD请求获取文件大小和ETag，并确认服务器是否支持分段下载
+        def head():
+            response = get_session().head(url, headers=IDENTITY_ENCODING, allow_redirects=True,
+                                          timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+            return response
+        head_response = _with_retries(head, f"获取{file_desc}信息",
+                                      progress.retry if progress is not None else None)
+        total_size = int(head_response.headers.get('content-length', 0))
+        accepts_ranges = head_response.headers.get('accept-ranges', '').lower() == 'bytes'
+        etag = head_response.headers.get('x-linked-etag') or head_response.headers.get('etag')
         
         if total_size == 0:
             logger.warning(f"警告: {url} 没有返回content-length")
-            # 尝试HEAD请求获取大小
-            head_response = requests.head(url)
-            total_size = int(head_response.headers.get('content-length', 0))
         
         logger.info(f"文件大小: {total_size} 字节 ({total_size/1024/1024:.2f} MB)")
         
+        if progress is None:
+            progress = FileProgress(ProgressAggregator(model_name, total_size),
+                                    os.path.basename(destination_path), total_size)
+        
         # 报告开始下载
-        report_progress("downloading", model_name, 0, f"开始下载{file_desc}")
-        
-        # 下载到临时文件
-        downloaded_size = 0
-        chunk_size = 8192
-        last_report_time = time.time()
-        last_percentage = 0
-        
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            temp_path = temp_file.name
-            for chunk in response.iter_content(chunk_size=chunk_size):
-                if chunk:
-                    temp_file.write(chunk)
-                    downloaded_size += len(chunk)
-                    
-                    # 计算进度百分比
-                    if total_size > 0:
-                        percentage = int((downloaded_size / total_size) * 100)
-                        current_time = time.time()
-                        
-                        # 每秒最多报告一次进度，或者进度变化超过5%
-                        if (current_time - last_report_time >= 1.0 or 
-                            (percentage - last_percentage >= 5 and current_time - last_report_time >= 0.5)):
-                            message = f"下载进度: {downloaded_size}/{total_size} 字节"
-                            report_progress("downloading", model_name, percentage, message)
-                            last_report_time = current_time
-                            last_percentage = percentage
+        progress.message(f"开始下载{file_desc}")
+        
+        ranged = accepts_ranges and total_size >= RANGE_MIN_SIZE
+        partial_path = f"{destination_path}.partial"
+        resumed = _prepare_partial_download(destination_path, url, etag, total_size,
+                                            RANGE_PARTS if ranged else 0)
+        if resumed and accepts_ranges:
+            progress.add_resumed(resumed)
+        
+        hasher = _make_hasher(size or total_size, sha256, blob_id)
+        if ranged:
+            logger.info(f"使用{RANGE_PARTS}段并发下载{file_desc}")
+            _download_in_ranges(url, partial_path, total_size, progress, etag, hasher)
+        else:
+            # 续传时只需要把已有的部分补进哈希
+            if hasher is not None and resumed and accepts_ranges:
+                hasher.update_from_file(partial_path)
+            def download_whole():
+                have = os.path.getsize(partial_path) if accepts_ranges and os.path.exists(partial_path) else 0
+                if total_size and have == total_size:
+                    # 上次已经下载完整，只是没能移动到目标位置；再请求bytes=<size>-会得到416
+                    logger.info(f"{file_desc}的未完成下载已包含全部内容，不再请求")
+                    return
+                if total_size and have > total_size:
+                    # 比远端文件还大，说明已损坏，从头下载
+                    os.unlink(partial_path)
+                    progress.add(-have)
+                size = _download_to_partial(url, partial_path, progress, etag=etag,
+                                            resume=accepts_ranges, hasher=hasher)
+                if total_size and size != total_size:
+                    raise RetryableDownloadError(f"文件不完整: 预期 {total_size} 字节, 实际 {size} 字节")
+            _with_retries(download_whole, f"下载{file_desc}", progress.retry)
+        
+        if hasher is not None:
+            if not hasher.matches():
+                logger.error(f"{file_desc}哈希不匹配! 预期: {hasher.expected}, 实际: {hasher.hexdigest()}")
+                for path in _partial_files(destination_path):
+                    os.unlink(path)
+                report_progress("error", model_name, 0, f"{file_desc}下载失败: 文件校验失败")
+                return finish(False)
+            logger.info(f"{file_desc} {hasher.algorithm}校验通过")
         
         # 下载完成，移动到目标位置
         logger.info(f"下载完成，将临时文件移动到: {destination_path}")
         
-        # 确保目标目录存在
-        os.makedirs(os.path.dirname(destination_path), exist_ok=True)
-        
         # 如果目标文件已存在，先备份
         if os.path.exists(destination_path):
             backup_path = f"{destination_path}.bak"
             logger.info(f"目标文件已存在，备份到: {backup_path}")
             shutil.move(destination_path, backup_path)
         
-        # 移动临时文件到目标位置
-        shutil.move(temp_path, destination_path)
+        # 移动临时文件到目标位置，并删除断点续传状态
+        shutil.move(partial_path, destination_path)
+        for path in _partial_files(destination_path):
+            os.unlink(path)
         
         # 验证文件大小
         if os.path.exists(destination_path):
@@ -122,35 +674,94 @@ def download_file(url, destination_path, model_name, file_desc="文件"):
             logger.info(f"验证文件大小: 预期 {total_size} 字节, 实际 {actual_size} 字节")
             
             if actual_size > 0 and (total_size == 0 or abs(actual_size - total_size) < 1024):  # 允许1KB的误差
-                logger.info(f"{file_desc}下载成功!")
-                report_progress("downloading", model_name, 100, f"{file_desc}下载完成")
+                finish(True)
+                logger.info(f"{file_desc}下载成功! 平均速度 {progress.speed() / 1024 / 1024:.2f} MB/s")
+                progress.message(f"{file_desc}下载完成")
                 return True
             else:
                 logger.error(f"文件大小不匹配! 预期: {total_size}, 实际: {actual_size}")
                 # 如果文件存在但大小不对，删除它
                 os.unlink(destination_path)
                 report_progress("error", model_name, 0, f"{file_desc}下载失败: 文件大小不匹配")
-                return False
+                return finish(False)
         else:
             logger.error(f"移动后目标文件不存在: {destination_path}")
             report_progress("error", model_name, 0, f"{file_desc}下载失败: 文件保存失败")
-            return False
+            return finish(False)
             
     except Exception as e:
         logger.error(f"下载{file_desc}时出错: {str(e)}")
         report_progress("error", model_name, 0, f"{file_desc}下载失败: {str(e)}")
-        
-        # 清理临时文件
-        if 'temp_path' in locals() and os.path.exists(temp_path):
-            try:
-                os.unlink(temp_path)
-            except:
-                pass
-                
-        return False
+        # 保留.partial文件和状态，下次下载时从断点继续
+        logger.info(f"已保留未完成的下载，下次将从断点继续: {destination_path}.partial")
+        return finish(False)
+
+def check_safetensors_header(file_path):
+    """只读取safetensors文件头来检查格式，不加载张量
 
-def verify_model(model_path, model_name):
-    """验证模型文件是否完整可用"""
+    文件格式: 8字节小端长度N + N字节JSON头 + 数据区。检查头能解析、
+    每个张量的dtype/shape与偏移量一致，并且所有张量恰好覆盖整个数据区。
+    返回错误描述，没有问题时返回None。
+    """
+    file_size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        prefix = f.read(8)
+        if len(prefix) < 8:
+            return "文件过小"
+        header_size = struct.unpack('<Q', prefix)[0]
+        if header_size > min(SAFETENSORS_MAX_HEADER, file_size - 8):
+            return f"文件头长度无效: {header_size}"
+        try:
+            header = json.loads(f.read(header_size))
+        except ValueError as e:
+            return f"文件头不是有效的JSON: {str(e)}"
+    
+    data_size = file_size - 8 - header_size
+    covered = 0
+    for name, info in header.items():
+        if name == '__metadata__':
+            continue
+        try:
+            begin, end = info['data_offsets']
+            element_count = 1
+            for dim in info['shape']:
+                element_count *= dim
+            expected_bytes = element_count * SAFETENSORS_DTYPE_SIZES[info['dtype']]
+        except (KeyError, TypeError, ValueError):
+            return f"张量 {name} 的描述无效"
+        if not 0 <= begin <= end <= data_size or end - begin != expected_bytes:
+            return f"张量 {name} 的偏移量与形状不一致"
+        covered = max(covered, end)
+    if covered != data_size:
+        return f"数据区大小不一致: 张量共 {covered} 字节, 文件中 {data_size} 字节"
+    return None
+
+def check_pytorch_weights(file_path):
+    """粗略检查pytorch_model.bin的格式，不反序列化
+
+    新格式是包含data.pkl的zip文件，旧格式以pickle协议头开始。
+    返回错误描述，没有问题时返回None。
+    """
+    if zipfile.is_zipfile(file_path):
+        try:
+            with zipfile.ZipFile(file_path) as archive:
+                if not any(name.endswith('data.pkl') for name in archive.namelist()):
+                    return "zip文件中没有data.pkl"
+        except zipfile.BadZipFile as e:
+            return f"zip文件损坏: {str(e)}"
+        return None
+    with open(file_path, 'rb') as f:
+        if f.read(1) != b'\x80':
+            return "不是有效的PyTorch权重文件"
+    return None
+
+def verify_model(model_path, model_name, manifest=None, full_load=False):
+    """验证模型文件是否完整可用
+
+    文件内容在下载时已经按上游哈希校验过，这里只检查必需文件是否齐全、
+    文件大小是否与清单一致、权重文件格式是否正确。full_load为True时
+    再用transformers完整加载一次（耗时且占用内存，默认关闭）。
+    """
     try:
         logger.info(f"验证模型: {model_name} 位于 {model_path}")
         report_progress("verifying", model_name, 90, "开始验证模型文件")
@@ -170,10 +781,10 @@ def verify_model(model_path, model_name):
         ]
         
         # 至少需要一个模型权重文件
-        weight_files = [
-            'pytorch_model.bin',
-            'model.safetensors'
-        ]
+        weight_checks = {
+            'model.safetensors': check_safetensors_header,
+            'pytorch_model.bin': check_pytorch_weights
+        }
         
         # 检查必需文件
         for required_file in required_files:
@@ -182,93 +793,136 @@ def verify_model(model_path, model_name):
                 logger.error(f"缺少必需文件: {required_file}")
                 report_progress("error", model_name, 0, f"模型验证失败: 缺少{required_file}")
                 return False
+        
+        # 检查文件大小与清单一致（内容已在下载时校验）
+        if manifest:
+            for file_name, entry in manifest.get('files', {}).items():
+                file_path = os.path.join(model_path, file_name)
+                if not os.path.isfile(file_path) or os.path.getsize(file_path) != entry.get('size'):
+                    logger.error(f"文件与清单不一致: {file_name}")
+                    report_progress("error", model_name, 0, f"模型验证失败: {file_name}不完整")
+                    return False
                 
         # 检查模型权重文件
         has_weights = False
-        for weight_file in weight_files:
+        for weight_file, check in weight_checks.items():
             weight_path = os.path.join(model_path, weight_file)
-            if os.path.exists(weight_path):
-                file_size = os.path.getsize(weight_path)
-                logger.info(f"找到模型权重文件: {weight_file}, 大小: {file_size/1024/1024:.2f} MB")
-                
-                # 检查文件大小是否合理 (至少100MB)
-                if file_size < 100 * 1024 * 1024:
-                    logger.warning(f"模型权重文件过小: {weight_file} ({file_size/1024/1024:.2f} MB)")
-                    continue
-                    
-                has_weights = True
-                break
+            if not os.path.exists(weight_path):
+                continue
+            file_size = os.path.getsize(weight_path)
+            logger.info(f"找到模型权重文件: {weight_file}, 大小: {file_size/1024/1024:.2f} MB")
+            
+            problem = check(weight_path)
+            if problem:
+                logger.error(f"模型权重文件无效: {weight_file}: {problem}")
+                report_progress("error", model_name, 0, f"模型验证失败: {weight_file}无效")
+                return False
+            has_weights = True
                 
         if not has_weights:
             logger.error("未找到有效的模型权重文件")
             report_progress("error", model_name, 0, "模型验证失败: 未找到有效的模型权重文件")
             return False
-            
-        # 列出模型目录中的所有文件
-        files = os.listdir(model_path)
-        total_size = 0
-        file_count = 0
         
-        logger.info(f"模型目录内容:")
-        for file in files:
-            file_path = os.path.join(model_path, file)
-            if os.path.isfile(file_path):
-                file_size = os.path.getsize(file_path)
-                total_size += file_size
-                file_count += 1
-                logger.info(f"  - {file}: {file_size/1024/1024:.2f} MB")
-                
-        logger.info(f"模型总大小: {total_size/1024/1024:.2f} MB, 文件数: {file_count}")
-        
-        # 如果支持transformers库，尝试加载模型
-        if TRANSFORMERS_AVAILABLE:
-            try:
-                logger.info("使用transformers库加载模型进行深度验证")
-                report_progress("verifying", model_name, 95, "加载模型验证")
-                
-                # 尝试加载tokenizer
-                tokenizer = AutoTokenizer.from_pretrained(model_path)
-                logger.info("成功加载tokenizer")
-                
-                # 尝试加载模型
-                model = AutoModelForSeq2SeqLM.from_pretrained(model_path)
-                logger.info("成功加载模型")
-                
-                logger.info("验证通过: 模型可以被transformers库正确加载")
-                report_progress("verifying", model_name, 100, "模型验证成功")
-                return True
-            except Exception as e:
-                logger.error(f"使用transformers库验证模型时出错: {str(e)}")
-                # 继续使用文件验证方法
-        
-        # 如果文件大小合理且所有必需文件都存在，认为验证通过
-        if total_size > 200 * 1024 * 1024 and file_count >= 5:  # 至少200MB，且至少5个文件
-            logger.info("验证通过: 文件大小和数量合理")
-            report_progress("verifying", model_name, 100, "模型验证成功")
-            return True
-        else:
-            logger.warning(f"模型文件可能不完整: 大小 {total_size/1024/1024:.2f} MB, 文件数 {file_count}")
-            if total_size > 100 * 1024 * 1024:  # 如果总大小超过100MB，可能仍然可用
-                logger.info("尽管有警告，但文件大小超过100MB，可能仍能使用")
-                report_progress("verifying", model_name, 100, "模型验证成功但有警告")
-                return True
+        # 需要时使用transformers库完整加载模型
+        if full_load:
+            if not TRANSFORMERS_AVAILABLE:
+                logger.warning("未安装transformers，跳过完整加载验证")
             else:
-                report_progress("error", model_name, 0, "模型验证失败: 文件大小不足")
-                return False
+                try:
+                    logger.info("使用transformers库加载模型进行深度验证")
+                    report_progress("verifying", model_name, 95, "加载模型验证")
+                    
+                    # 尝试加载tokenizer
+                    tokenizer = AutoTokenizer.from_pretrained(model_path)
+                    logger.info("成功加载tokenizer")
+                    
+                    # 尝试加载模型
+                    model = AutoModelForSeq2SeqLM.from_pretrained(model_path)
+                    logger.info("成功加载模型")
+                except Exception as e:
+                    logger.error(f"使用transformers库验证模型时出错: {str(e)}")
+                    report_progress("error", model_name, 0, f"模型验证失败: {str(e)}")
+                    return False
+        
+        logger.info("验证通过")
+        report_progress("verifying", model_name, 100, "模型验证成功")
+        return True
                 
     except Exception as e:
         logger.error(f"验证模型时出错: {str(e)}")
         report_progress("error", model_name, 0, f"模型验证失败: {str(e)}")
         return False
 
+def export_onnx_model(model_path, model_name):
+    """导出ONNX模型供translate.py的onnx推理后端使用，已导出时直接跳过"""
+    try:
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    except ImportError:
+        logger.info("未安装optimum，跳过ONNX模型导出")
+        return False
+        
+    onnx_path = os.path.join(model_path, 'onnx')
+    if os.path.exists(os.path.join(onnx_path, 'config.json')):
+        logger.info(f"ONNX模型已存在: {onnx_path}")
+        return True
+        
+    try:
+        logger.info(f"导出ONNX模型到: {onnx_path}")
+        report_progress("verifying", model_name, 98, "导出ONNX模型")
+        model = ORTModelForSeq2SeqLM.from_pretrained(model_path, export=True)
+        model.save_pretrained(onnx_path)
+        logger.info("ONNX模型导出成功")
+        return True
+    except Exception as e:
+        # 导出失败不影响默认的torch推理后端
+        logger.warning(f"导出ONNX模型失败: {str(e)}")
+        shutil.rmtree(onnx_path, ignore_errors=True)
+        return False
+
+def save_fast_tokenizer(model_path, model_name):
+    """模型没有自带tokenizer.json时，转换出快速(Rust)分词器并保存
+
+    translate.py加载时会优先使用tokenizer.json。没有对应快速分词器的模型
+    （例如Marian只有sentencepiece分词器）会跳过。只写入tokenizer.json，
+    不改动下载清单中的其他文件。
+    """
+    tokenizer_json = os.path.join(model_path, 'tokenizer.json')
+    if os.path.exists(tokenizer_json):
+        logger.info("模型已包含tokenizer.json")
+        return True
+    if not TRANSFORMERS_AVAILABLE:
+        logger.info("未安装transformers，跳过快速分词器转换")
+        return False
+        
+    try:
+        tokenizer = AutoTokenizer.from_pretrained(model_path, use_fast=True)
+        if not getattr(tokenizer, 'is_fast', False):
+            logger.info(f"{type(tokenizer).__name__}没有快速分词器版本，跳过转换")
+            return False
+        report_progress("verifying", model_name, 97, "保存快速分词器")
+        tokenizer.backend_tokenizer.save(tokenizer_json)
+        logger.info(f"已保存快速分词器: {tokenizer_json}")
+        return True
+    except Exception as e:
+        # 转换失败时translate.py会继续使用原来的分词器
+        logger.warning(f"转换快速分词器失败: {str(e)}")
+        if os.path.exists(tokenizer_json):
+            os.unlink(tokenizer_json)
+        return False
+
 def get_model_files_info(model_name):
-    """获取模型文件信息"""
+    """获取模型文件信息
+
+    使用blobs=true让API同时返回每个文件的git blob id，LFS文件还会有sha256，
+    用于判断本地文件是否需要重新下载。
+    """
     try:
         logger.info(f"获取模型文件信息: {model_name}")
         report_progress("preparing", model_name, 5, "获取模型信息")
         
-        api_url = f"https://huggingface.co/api/models/{model_name}"
-        response = requests.get(api_url)
+        api_url = f"{HF_ENDPOINT}/api/models/{model_name}"
+        response = get_session().get(api_url, params={'blobs': 'true'}, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
         
         data = response.json()
@@ -279,9 +933,12 @@ def get_model_files_info(model_name):
         files = []
         for item in data['siblings']:
             if 'rfilename' in item and 'size' in item:
+                lfs = item.get('lfs') or {}
                 files.append({
                     'name': item['rfilename'],
-                    'size': item['size']
+                    'size': item['size'],
+                    'sha256': lfs.get('sha256'),
+                    'blob_id': item.get('blobId')
                 })
                 
         logger.info(f"找到{len(files)}个文件")
@@ -290,7 +947,79 @@ def get_model_files_info(model_name):
         logger.error(f"获取模型文件信息时出错: {str(e)}")
         return []
 
-def download_model_direct(model_dir, model_name):
+def _local_file_matches(file_path, file_info):
+    """按远端的sha256（LFS文件）或git blob id检查本地文件是否一致"""
+    if not os.path.isfile(file_path) or os.path.getsize(file_path) != file_info['size']:
+        return False
+    hasher = _make_hasher(file_info['size'], file_info.get('sha256'), file_info.get('blob_id'))
+    if hasher is None:
+        return False
+    hasher.update_from_file(file_path)
+    return hasher.matches()
+
+def load_manifest(model_path):
+    """读取模型目录中的下载清单，不存在或损坏时返回空清单"""
+    try:
+        with open(os.path.join(model_path, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if isinstance(manifest.get('files'), dict):
+            return manifest
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {"files": {}}
+
+def save_manifest(model_path, manifest):
+    """原子地写入下载清单"""
+    manifest_path = os.path.join(model_path, MANIFEST_FILE)
+    temp_path = f"{manifest_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, manifest_path)
+
+def _manifest_entry(file_path, file_info):
+    """清单中记录的文件信息，mtime用于发现本地被改动过的文件"""
+    return {
+        'size': file_info['size'],
+        'sha256': file_info.get('sha256'),
+        'blob_id': file_info.get('blob_id'),
+        'mtime': os.path.getmtime(file_path)
+    }
+
+def is_file_up_to_date(model_path, manifest, file_info):
+    """判断本地文件是否与远端一致，一致时无需重新下载
+
+    清单记录与远端的大小/哈希相同且本地文件没有改动时直接跳过；
+    否则（例如旧版本下载的模型没有清单）重新计算一次本地哈希。
+    """
+    file_path = os.path.join(model_path, file_info['name'])
+    if not os.path.isfile(file_path):
+        return False
+    
+    entry = manifest['files'].get(file_info['name'])
+    if (entry and entry.get('size') == file_info['size']
+            and entry.get('sha256') == file_info.get('sha256')
+            and entry.get('blob_id') == file_info.get('blob_id')
+            and entry.get('mtime') == os.path.getmtime(file_path)
+            and os.path.getsize(file_path) == file_info['size']):
+        return True
+    
+    if _local_file_matches(file_path, file_info):
+        manifest['files'][file_info['name']] = _manifest_entry(file_path, file_info)
+        return True
+    return False
+
+def cleanup_backups(model_path):
+    """模型验证通过后删除下载时留下的.bak备份"""
+    for root, _, names in os.walk(model_path):
+        for name in names:
+            if name.endswith('.bak'):
+                try:
+                    os.unlink(os.path.join(root, name))
+                    logger.info(f"删除旧备份: {name}")
+                except OSError as e:
+                    logger.warning(f"无法删除旧备份 {name}: {str(e)}")
+
+def download_model_direct(model_dir, model_name, full_load=False):
     """直接从Hugging Face下载模型文件"""
     try:
         logger.info(f"开始下载模型: {model_name}")
@@ -325,51 +1054,84 @@ def download_model_direct(model_dir, model_name):
             # 根据文件名和大小判断重要性
             if ('config.json' in name or 
                 'tokenizer' in name or 
+                'special_tokens_map.json' in name or
                 'vocab.json' in name or 
+                name.endswith('.spm') or
                 'pytorch_model.bin' in name or
                 'model.safetensors' in name):
                 important_files.append(file)
             else:
                 optional_files.append(file)
                 
-        # 先下载重要文件
-        logger.info(f"下载{len(important_files)}个重要文件")
+        # 跳过与本地清单一致的文件，只下载缺失或已变化的文件
+        manifest = load_manifest(model_path)
+        up_to_date = [file for file in important_files if is_file_up_to_date(model_path, manifest, file)]
+        pending_files = [file for file in important_files if file not in up_to_date]
+        if up_to_date:
+            logger.info(f"{len(up_to_date)}个文件已是最新，跳过下载")
+            _telemetry.skip(len(up_to_date))
+        
+        logger.info(f"下载{len(pending_files)}个重要文件")
         report_progress("downloading", model_name, 10, f"开始下载模型文件")
         
-        success_count = 0
-        important_count = len(important_files)
+        important_count = len(pending_files)
+        
+        # 所有文件共享一个进度汇总器 (重要文件占10%-80%)
+        total_bytes = sum(file['size'] for file in pending_files)
+        progress = ProgressAggregator(model_name, total_bytes, 10, 80)
         
-        # 下载每个重要文件
-        for i, file in enumerate(important_files):
+        # 同时下载多个重要文件
+        def download_one(i, file):
             file_name = file['name']
-            file_url = f"https://huggingface.co/{model_name}/resolve/main/{file_name}"
+            file_url = f"{HF_ENDPOINT}/{model_name}/resolve/main/{file_name}"
             dest_path = os.path.join(model_path, file_name)
             
             # 创建子目录
             os.makedirs(os.path.dirname(dest_path), exist_ok=True)
             
-            # 计算当前文件在总下载过程中的权重 (重要文件占80%)
-            file_progress_start = 10 + (i / important_count) * 70
-            file_progress_end = 10 + ((i + 1) / important_count) * 70
-            
-            # 下载前更新进度
-            report_progress("downloading", model_name, int(file_progress_start), f"下载文件 {i+1}/{important_count}: {file_name}")
-            
-            # 下载文件
-            if download_file(file_url, dest_path, model_name, f"文件 {i+1}/{important_count}: {file_name}"):
-                success_count += 1
-                # 下载成功后更新进度
-                report_progress("downloading", model_name, int(file_progress_end), f"文件 {i+1}/{important_count} 下载完成")
-            else:
-                logger.error(f"下载文件 {file_name} 失败")
-                if "pytorch_model.bin" in file_name or "config.json" in file_name:
-                    logger.error(f"关键文件下载失败，无法继续")
-                    return False
+            file_progress = FileProgress(progress, file_name, file['size'])
+            return download_file(file_url, dest_path, model_name, f"文件 {i+1}/{important_count}: {file_name}",
+                                 file_progress, file.get('sha256'), file.get('blob_id'), file['size'])
+        
+        with ThreadPoolExecutor(max_workers=MAX_PARALLEL_FILES) as executor:
+            futures = [executor.submit(download_one, i, file) for i, file in enumerate(pending_files)]
+            results = [future.result() for future in futures]
+        
+        success_count = sum(1 for ok in results if ok)
+        logger.info(f"成功下载 {success_count}/{important_count} 个文件")
+        
+        for file, ok in zip(pending_files, results):
+            file_name = file['name']
+            if ok:
+                manifest['files'][file_name] = _manifest_entry(os.path.join(model_path, file_name), file)
+                continue
+            manifest['files'].pop(file_name, None)
+            logger.error(f"下载文件 {file_name} 失败")
+            if "pytorch_model.bin" in file_name or "config.json" in file_name:
+                logger.error(f"关键文件下载失败，无法继续")
+                manifest['verified'] = False
+                save_manifest(model_path, manifest)
+                return False
+        
+        manifest['model'] = model_name
+        
+        # 没有文件变化且之前已验证过时不必再次验证
+        if not pending_files and manifest.get('verified'):
+            logger.info(f"模型 {model_name} 已是最新，无需重新下载")
+            save_manifest(model_path, manifest)
+            cleanup_backups(model_path)
+            report_progress("completed", model_name, 100, "模型已是最新")
+            return True
         
         # 验证模型
         report_progress("verifying", model_name, 80, "验证模型文件")
-        if verify_model(model_path, model_name):
+        manifest['verified'] = verify_model(model_path, model_name, manifest, full_load)
+        save_manifest(model_path, manifest)
+        if manifest['verified']:
             logger.info(f"模型 {model_name} 下载并验证成功")
+            cleanup_backups(model_path)
+            save_fast_tokenizer(model_path, model_name)
+            export_onnx_model(model_path, model_name)
             report_progress("completed", model_name, 100, "模型下载和验证完成")
             return True
         else:
@@ -382,22 +1144,25 @@ def download_model_direct(model_dir, model_name):
         report_progress("error", model_name, 0, f"下载出错: {str(e)}")
         return False
 
-def download_model(model_dir, model_name):
+def download_model(model_dir, model_name, full_load=False):
     """主下载函数"""
     report_progress("preparing", model_name, 0, f"准备下载模型")
-    return download_model_direct(model_dir, model_name)
+    return download_model_direct(model_dir, model_name, full_load)
 
 def main():
     """主函数"""
     try:
         # 解析命令行参数
-        if len(sys.argv) < 4:
-            print("用法: python download_model.py <model_directory> <zh_to_en_model_name> <en_to_zh_model_name>")
+        args = sys.argv[1:]
+        full_load = '--full-verify' in args
+        args = [arg for arg in args if arg != '--full-verify']
+        if len(args) < 3:
+            print("用法: python download_model.py <model_directory> <zh_to_en_model_name> <en_to_zh_model_name> [--full-verify]")
             sys.exit(1)
             
-        model_dir = sys.argv[1]
-        zh_en_model = sys.argv[2]
-        en_zh_model = sys.argv[3]
+        model_dir = args[0]
+        zh_en_model = args[1]
+        en_zh_model = args[2]
         
         logger.info(f"模型保存到目录: {model_dir}")
         logger.info(f"要下载的模型: {zh_en_model}, {en_zh_model}")
@@ -407,17 +1172,26 @@ def main():
         # 确保目录存在
         os.makedirs(model_dir, exist_ok=True)
         
-        # 下载中文到英文模型
-        logger.info(f"开始下载模型: {zh_en_model}")
-        zh_en_success = download_model(model_dir, zh_en_model)
+        # 同时下载中文到英文和英文到中文两个模型
+        logger.info(f"开始下载模型: {zh_en_model}, {en_zh_model}")
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            zh_en_future = executor.submit(download_model, model_dir, zh_en_model, full_load)
+            en_zh_future = executor.submit(download_model, model_dir, en_zh_model, full_load)
+            zh_en_success = zh_en_future.result()
+            en_zh_success = en_zh_future.result()
+        
+        # 输出下载汇总（字节数、总耗时、每个文件的耗时和速度），供安装程序记录，
+        # 也可以用本地模拟服务器对比不同下载实现的性能
+        summary = _telemetry.summary()
+        logger.info(f"下载汇总: {summary['bytes']} 字节, 耗时 {summary['wallSeconds']} 秒, "
+                    f"重试 {summary['retries']} 次, 卡顿 {summary['stalls']} 次")
+        print(json.dumps({"summary": summary}, ensure_ascii=False), flush=True)
+        
         if not zh_en_success:
             logger.error(f"中文到英文模型下载失败")
             print("中文到英文模型下载失败")
             sys.exit(1)
             
-        # 下载英文到中文模型
-        logger.info(f"开始下载模型: {en_zh_model}")
-        en_zh_success = download_model(model_dir, en_zh_model)
         if not en_zh_success:
             logger.error(f"英文到中文模型下载失败")
             print("英文到中文模型下载失败")
@@ -402,27 +402,33 @@ const testConnection = async () => {
   }
 };
 
-// 翻译游戏描述信息
-const translateGameDescription = async (description) => {
+// 批量翻译多个游戏描述，结果顺序与输入一致
+const translateGameDescriptions = async (descriptions) => {
+  const results = descriptions.map(description => description || "暂无描述");
+  const indices = descriptions
+    .map((description, index) => (description ? index : -1))
+    .filter(index => index !== -1);
+  
+  if (indices.length === 0) {
+    return results;
+  }
+  
   try {
-    if (!description) {
-      return "暂无描述";
-    }
+    console.log(`批量翻译 ${indices.length} 条游戏描述...`);
+    const translated = await translationService.translateBatch(indices.map(index => descriptions[index]));
     
-    console.log('翻译游戏描述...');
-    const result = await translationService.translateText(description);
-    
-    if (result && result.translatedText) {
-      console.log('翻译成功');
-      return result.translatedText;
-    } else {
-      console.log('翻译失败，使用原始描述');
-      return description;
-    }
+    indices.forEach((index, i) => {
+      if (translated[i] && translated[i].translatedText) {
+        results[index] = translated[i].translatedText;
+      }
+    });
+    console.log('批量翻译完成');
   } catch (error) {
-    console.error('翻译游戏描述失败:', error);
-    return description; // 翻译失败时返回原始描述
+    console.error('批量翻译游戏描述失败:', error);
+    // 翻译失败时保留原始描述
   }
+  
+  return results;
 };
 
 // 将游戏信息保存到数据库
@@ -599,19 +605,19 @@ const searchGame = async (gameName) => {
           }
         }
         
-        // 翻译游戏描述到中文
-        try {
-          updateProgress(progressPercentage + 6, `翻译游戏 ${game.name} 的描述`);
-          result.description = await translateGameDescription(result.description);
-        } catch (err) {
-          console.error('翻译游戏描述失败:', err);
-          // 保持原始描述
-        }
-        
         // 添加处理后的结果
         processedResults.push(result);
       }
       
+      // 所有游戏的描述一次性批量翻译到中文
+      updateProgress(88, '翻译游戏描述');
+      const translatedDescriptions = await translateGameDescriptions(
+        processedResults.map(result => result.description)
+      );
+      processedResults.forEach((result, index) => {
+        result.description = translatedDescriptions[index];
+      });
+      
       updateProgress(90, '完成所有游戏处理');
       
       return {
@@ -4,9 +4,171 @@ import sys
 import json
 import importlib
 import io
+import re
+import time
+import hashlib
+import sqlite3
+import unicodedata
+import argparse
+import threading
+import queue
+import heapq
+import itertools
+import shutil
+import subprocess
+import csv
+from collections import OrderedDict, deque, namedtuple
+from contextlib import contextmanager, nullcontext
+
+_PROCESS_STARTED = time.perf_counter()
+_PROCESS_STARTED_WALL = time.time()
 
 # 确保 Python 正确处理 UTF-8 输出
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+if sys.stdin is not None:
+    sys.stdin = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+
+# 服务、基准测试和批量模式下标准输出只用于JSON，日志改写到标准错误
+_response_stream = sys.stdout
+if len(sys.argv) > 1 and sys.argv[1] in ("--server", "--benchmark", "--bulk", "--cold-start"):
+    sys.stdout = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', line_buffering=True)
+
+# Chrome trace output (chrome://tracing, Perfetto); set to a file path to enable
+TRACE_FILE = os.environ.get("TRANSLATE_TRACE_FILE")
+
+class _ChromeTraceWriter:
+    """Appends complete ("X") events to a Chrome trace file as they happen.
+
+    The file is written in the JSON array format without the closing bracket,
+    which trace viewers accept, so a long-running server never has to
+    rewrite it.
+    """
+    
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._file = open(path, 'w', encoding='utf-8')
+        self._file.write("[\n")
+        self._file.flush()
+    
+    def write(self, name, started, duration, args=None):
+        event = {
+            "name": name,
+            "ph": "X",
+            "ts": round((started - _PROCESS_STARTED) * 1e6),
+            "dur": round(duration * 1e6),
+            "pid": os.getpid(),
+            "tid": threading.get_ident()
+        }
+        if args:
+            event["args"] = args
+        with self._lock:
+            self._file.write(json.dumps(event, ensure_ascii=False) + ",\n")
+            self._file.flush()
+
+_trace_writer = None
+
+def enable_trace_file(path):
+    global _trace_writer
+    if path and _trace_writer is None:
+        _trace_writer = _ChromeTraceWriter(path)
+
+class Tracer:
+    """Monotonic per-stage timers for one unit of work.
+
+    trace_stage() records into the tracer activated on the current thread,
+    or into the process-wide tracer (startup, model loads) when there is
+    none. A stage entered several times accumulates its durations.
+    """
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings = OrderedDict()
+    
+    @contextmanager
+    def activate(self):
+        previous = getattr(_trace_local, "tracer", None)
+        _trace_local.tracer = self
+        try:
+            yield self
+        finally:
+            _trace_local.tracer = previous
+    
+    def record(self, name, started, duration, args=None):
+        self.timings[name] = self.timings.get(name, 0.0) + duration * 1000
+        if _trace_writer is not None:
+            _trace_writer.write(name, started, duration, args)
+    
+    def summary(self):
+        """Milliseconds per stage plus totalMs since the tracer was created"""
+        summary = {f"{name}Ms": round(ms, 1) for name, ms in self.timings.items()}
+        summary["totalMs"] = round((time.perf_counter() - self.started) * 1000, 1)
+        return summary
+
+_trace_local = threading.local()
+_process_tracer = Tracer()
+
+@contextmanager
+def trace_stage(name, **args):
+    tracer = getattr(_trace_local, "tracer", None) or _process_tracer
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        tracer.record(name, started, time.perf_counter() - started, args)
+
+def process_timings():
+    """Process-level stages (dependency check, imports, model loads) and interpreter startup"""
+    timings = _process_tracer.summary()
+    try:
+        import psutil
+        startup = _PROCESS_STARTED_WALL - psutil.Process().create_time()
+        timings["interpreterStartupMs"] = round(startup * 1000, 1)
+    except Exception:
+        pass
+    return timings
+
+def _percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[int(rank) - 1]
+
+class TimingAggregator:
+    """Rolling per-stage latency aggregates over the most recent requests"""
+    
+    def __init__(self, window=500):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.requests = 0
+    
+    def add(self, timings):
+        if not timings:
+            return
+        with self._lock:
+            self._samples.append(timings)
+            self.requests += 1
+    
+    def stats(self):
+        with self._lock:
+            samples = list(self._samples)
+            requests = self.requests
+        stages = OrderedDict()
+        for timings in samples:
+            for name, ms in timings.items():
+                stages.setdefault(name, []).append(ms)
+        
+        aggregates = {}
+        for name, values in stages.items():
+            values.sort()
+            aggregates[name] = {
+                "count": len(values),
+                "mean": round(sum(values) / len(values), 1),
+                "p50": _percentile(values, 50),
+                "p95": _percentile(values, 95),
+                "max": values[-1]
+            }
+        return {"requests": requests, "window": len(samples), "stages": aggregates}
 
 # Check and install missing dependencies
 def check_and_install_dependencies():
@@ -47,50 +209,893 @@ def check_and_install_dependencies():
     
     return True
 
-# Ensure all dependencies are installed
-if not check_and_install_dependencies():
-    print(json.dumps({"error": "Failed to install dependencies"}, ensure_ascii=False), flush=True)
-    sys.exit(1)
+# Marker written once the environment has been verified (by --doctor, or by
+# the first successful dependency check). It lives next to translation_models
+# and lets every later run skip the dependency checks entirely.
+ENV_MARKER_FILE = "translate_env.json"
+REQUIRED_PACKAGES = ['transformers', 'torch', 'sentencepiece']
+OPTIONAL_PACKAGES = ['sacremoses', 'optimum', 'onnxruntime', 'safetensors', 'psutil']
 
-# Import necessary libraries
-try:
-    from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
-except Exception as e:
-    print(json.dumps({"error": f"Failed to import transformers: {str(e)}"}, ensure_ascii=False), flush=True)
-    sys.exit(1)
+def _env_marker_path(model_dir):
+    return os.path.join(os.path.dirname(os.path.abspath(model_dir)), ENV_MARKER_FILE)
 
-def translate_text(text, model_dir, model_name):
+def _read_env_marker(model_dir):
+    """Return the marker if it was written for this Python interpreter"""
     try:
-        # Format model path correctly for the OS
-        safe_model_name = model_name.replace('/', os.path.sep)
-        model_path = os.path.join(model_dir, safe_model_name)
-        
-        print(f"Loading model and tokenizer from: {model_path}")
+        with open(_env_marker_path(model_dir), 'r', encoding='utf-8') as f:
+            marker = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if marker.get("python") != sys.executable:
+        return None
+    return marker
+
+def _installed_versions(packages):
+    """Package versions from installed metadata, without importing the packages"""
+    from importlib import metadata
+    versions = {}
+    for package in packages:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return versions
+
+def write_env_marker(model_dir):
+    marker = {
+        "python": sys.executable,
+        "pythonVersion": sys.version.split()[0],
+        "packages": _installed_versions(REQUIRED_PACKAGES + OPTIONAL_PACKAGES),
+        "verifiedAt": time.strftime("%Y-%m-%dT%H:%M:%S")
+    }
+    marker_path = _env_marker_path(model_dir)
+    os.makedirs(os.path.dirname(marker_path), exist_ok=True)
+    with open(marker_path, 'w', encoding='utf-8') as f:
+        json.dump(marker, f, ensure_ascii=False, indent=2)
+    return marker
+
+def run_doctor(model_dir):
+    """One-time environment setup: install/verify dependencies, then write the marker"""
+    if not check_and_install_dependencies():
+        return {"ok": False, "error": "Failed to install dependencies"}
+    
+    try:
+        for package in REQUIRED_PACKAGES:
+            importlib.import_module(package)
+    except Exception as e:
+        return {"ok": False, "error": f"Failed to import {package}: {str(e)}"}
+    
+    marker = write_env_marker(model_dir)
+    return {"ok": True, "marker": _env_marker_path(model_dir), **marker}
+
+# transformers (and with it torch) is imported on the first model load, so
+# requests answered from the translation cache, or rejected early, never pay
+# for it
+_transformers = None
+
+def _import_transformers(model_dir):
+    global _transformers
+    if _transformers is None:
+        if _read_env_marker(model_dir) is None:
+            # Environment not verified yet: run the dependency check once and
+            # remember the result for later runs
+            with trace_stage("dependencyCheck"):
+                if not check_and_install_dependencies():
+                    raise RuntimeError("Failed to install dependencies")
+                write_env_marker(model_dir)
         
-        # Check if directory exists
-        if not os.path.exists(model_path):
-            raise Exception(f"Model directory does not exist: {model_path}")
+        # Import necessary libraries
+        try:
+            with trace_stage("importTransformers"):
+                import transformers
+        except Exception as e:
+            # The environment changed since it was verified; force a recheck next time
+            try:
+                os.unlink(_env_marker_path(model_dir))
+            except OSError:
+                pass
+            raise RuntimeError(f"Failed to import transformers: {str(e)}. Run translate.py --doctor <model_dir>")
+        _transformers = transformers
+    return _transformers
+
+# Resident model memory budget for the registry (MB). Two Marian models in
+# fp32 take roughly 600MB, so the default keeps both directions loaded.
+DEFAULT_MODEL_MEMORY_MB = int(os.environ.get("TRANSLATE_MODEL_MEMORY_MB", "2048"))
+
+# Inference backends. "torch" is the fp32 AutoModelForSeq2SeqLM reference;
+# "quantized" applies dynamic int8 quantization to its Linear layers;
+# "onnx" runs an exported copy of the model with onnxruntime (via optimum).
+BACKENDS = ("torch", "quantized", "onnx")
+DEFAULT_BACKEND = os.environ.get("TRANSLATE_BACKEND", "torch")
+# Exported ONNX models are cached in this subdirectory of each model
+ONNX_SUBDIR = "onnx"
+
+def export_onnx_model(model_path):
+    """Export a model to ONNX once and cache it under model_path/onnx"""
+    try:
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    except ImportError:
+        raise RuntimeError("The onnx backend requires optimum: pip install optimum[onnxruntime]")
+    
+    onnx_path = os.path.join(model_path, ONNX_SUBDIR)
+    if not os.path.exists(os.path.join(onnx_path, "config.json")):
+        print(f"Exporting ONNX model to {onnx_path}...")
+        model = ORTModelForSeq2SeqLM.from_pretrained(model_path, export=True, local_files_only=True)
+        model.save_pretrained(onnx_path)
+    return onnx_path
+
+def _quantize_dynamic(model):
+    """Dynamic int8 quantization of the Linear layers for CPU inference"""
+    import torch
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+# Low-memory loading: prefer model.safetensors, whose tensors are memory-mapped
+# rather than read into freshly allocated buffers, and build the model with
+# low_cpu_mem_usage so the weights aren't held twice while loading
+LOW_MEMORY_LOAD = os.environ.get("TRANSLATE_LOW_MEMORY_LOAD", "1") != "0"
+# Convert pytorch_model.bin to model.safetensors the first time such a model is
+# loaded (also available on demand via --convert-safetensors)
+AUTO_CONVERT_SAFETENSORS = os.environ.get("TRANSLATE_CONVERT_SAFETENSORS", "0") == "1"
+SAFETENSORS_FILE = "model.safetensors"
+PYTORCH_WEIGHTS_FILE = "pytorch_model.bin"
+
+def current_rss_bytes():
+    """Resident set size of this process, or None if it can't be determined"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except Exception:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return None
+
+def peak_rss_bytes():
+    """Peak resident set size of this process, or None if it can't be determined"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+        return peak if sys.platform == "darwin" else peak * 1024
+    except Exception:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset
+    except Exception:
+        return None
+
+def _to_mb(size):
+    return None if size is None else round(size / 1024 / 1024, 1)
+
+def _model_path(model_dir, model_name):
+    # Format model path correctly for the OS
+    return os.path.join(model_dir, model_name.replace('/', os.path.sep))
+
+def _weights_format(model_path):
+    if os.path.exists(os.path.join(model_path, SAFETENSORS_FILE)):
+        return "safetensors"
+    if os.path.exists(os.path.join(model_path, PYTORCH_WEIGHTS_FILE)):
+        return "bin"
+    return None
+
+def convert_to_safetensors(model_dir, model_name, model=None):
+    """One-time conversion of a model's pytorch_model.bin to model.safetensors.
+
+    Reuses an already loaded model when given. The original weights are kept
+    so the download manifest still matches. Returns the safetensors path.
+    """
+    model_path = _model_path(model_dir, model_name)
+    target = os.path.join(model_path, SAFETENSORS_FILE)
+    if os.path.exists(target):
+        return target
+    
+    if model is None:
+        transformers = _import_transformers(model_dir)
+        model = transformers.AutoModelForSeq2SeqLM.from_pretrained(
+            model_path, local_files_only=True, low_cpu_mem_usage=True)
+    
+    print(f"Converting {model_name} to safetensors...")
+    temp_dir = os.path.join(model_path, ".safetensors-tmp")
+    try:
+        model.save_pretrained(temp_dir, safe_serialization=True)
+        # Large models are written as shards plus an index; move all of them
+        for file in os.listdir(temp_dir):
+            if file.endswith((".safetensors", ".safetensors.index.json")):
+                os.replace(os.path.join(temp_dir, file), os.path.join(model_path, file))
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return target
+
+# Runtime tuning: torch thread counts picked by a short calibration run, plus
+# opt-in BetterTransformer / torch.compile. The chosen profile is stored next to
+# translation_models (like the cache and the environment marker) and reused by
+# later starts as long as the interpreter, torch version and core count match.
+RUNTIME_PROFILE_FILE = "runtime_profile.json"
+# "1"/"0" override the "compile" / "betterTransformer" settings of the profile.
+# Both are off by default: not every torch/optimum version supports them for
+# every model, and compilation makes the first requests slower
+TORCH_COMPILE = os.environ.get("TRANSLATE_TORCH_COMPILE")
+BETTER_TRANSFORMER = os.environ.get("TRANSLATE_BETTER_TRANSFORMER")
+# Thread counts within this fraction of the fastest count as equally fast; the smallest wins
+CALIBRATION_TOLERANCE = 0.1
+# Calibration runs before the server is ready (and so before the first
+# request is answered), so it uses greedy decoding on a few short sentences
+CALIBRATION_PROFILE = "fast"
+CALIBRATION_SAMPLES = 3
+
+# Profile applied to this process, set by apply_runtime_profile
+_runtime_profile = None
+
+def _runtime_profile_path(model_dir):
+    return os.path.join(os.path.dirname(os.path.abspath(model_dir)), RUNTIME_PROFILE_FILE)
+
+def default_thread_count():
+    """Intra-op threads without a calibrated profile: every core but one, which is left to the app"""
+    return max(1, (os.cpu_count() or 1) - 1)
+
+def _calibration_candidates():
+    limit = default_thread_count()
+    candidates = {1, limit}
+    threads = 2
+    while threads < limit:
+        candidates.add(threads)
+        threads *= 2
+    return sorted(candidates)
+
+def _runtime_fingerprint():
+    import torch
+    return {
+        "python": sys.executable,
+        "torch": getattr(torch, "__version__", None),
+        "cpuCount": os.cpu_count()
+    }
+
+def _read_runtime_profile(model_dir):
+    try:
+        with open(_runtime_profile_path(model_dir), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def load_runtime_profile(model_dir):
+    """Return the saved profile if it was calibrated for this interpreter, torch version and core count"""
+    runtime = _read_runtime_profile(model_dir)
+    if not runtime or not runtime.get("calibrated"):
+        return None
+    if any(runtime.get(key) != value for key, value in _runtime_fingerprint().items()):
+        return None
+    return runtime
+
+def save_runtime_profile(model_dir, runtime):
+    profile_path = _runtime_profile_path(model_dir)
+    os.makedirs(os.path.dirname(profile_path), exist_ok=True)
+    with open(profile_path, 'w', encoding='utf-8') as f:
+        json.dump(runtime, f, ensure_ascii=False, indent=2)
+
+def apply_runtime_profile(model_dir, threads=None):
+    """Configure torch for inference in this process and return the profile used.
+
+    Disables autograd globally and sets the intra-op thread count from the
+    saved profile, or to default_thread_count() if there is none (threads
+    overrides both, e.g. for pool workers). The compile/betterTransformer
+    settings of a saved profile are kept even when it is stale, since they
+    are user choices rather than measurements.
+    """
+    global _runtime_profile
+    _import_transformers(model_dir)
+    import torch
+    torch.set_grad_enabled(False)
+    saved = _read_runtime_profile(model_dir) or {}
+    runtime = load_runtime_profile(model_dir)
+    if runtime is None:
+        runtime = dict(_runtime_fingerprint(), threads=default_thread_count(), interopThreads=1, calibrated=False,
+                       compile=bool(saved.get("compile")), betterTransformer=bool(saved.get("betterTransformer")))
+    if threads:
+        runtime = dict(runtime, threads=threads)
+    _set_torch_threads(runtime["threads"])
+    _runtime_profile = runtime
+    return runtime
+
+def _runtime_option(key, env_value):
+    if env_value is not None:
+        return env_value == "1"
+    return bool((_runtime_profile or {}).get(key))
+
+def calibrate_runtime(model_dir, language_pairs, backend=DEFAULT_BACKEND):
+    """Pick the intra-op thread count by timing a short translation run at each candidate.
+
+    Candidates are 1, powers of two and default_thread_count(), so one core
+    is always left to the app. Each is timed once on CALIBRATION_SAMPLES
+    short BENCHMARK_CORPUS sentences per direction with the "fast" profile,
+    after a single warm-up pass; generate_batch is called directly, so the
+    translation cache doesn't hide the model. The models
+    must already be loaded and no worker pool forked yet (calibration runs
+    inference in this process). The result is saved, applied and returned.
+    """
+    global _runtime_profile
+    samples = []
+    for source, target in (("zh", "en"), ("en", "zh")):
+        model_name = language_pairs.get(f"{source}-{target}")
+        if model_name:
+            samples.append((model_name, BENCHMARK_CORPUS[source]["short"][:CALIBRATION_SAMPLES]))
+    
+    def run_samples():
+        started = time.perf_counter()
+        for model_name, texts in samples:
+            generate_batch(texts, model_dir, model_name, backend=backend, profile=CALIBRATION_PROFILE)
+        return (time.perf_counter() - started) * 1000
+    
+    # Warms up allocator and kernel caches so the first candidate isn't penalised
+    run_samples()
+    timings = {}
+    for threads in _calibration_candidates():
+        _set_torch_threads(threads)
+        timings[threads] = round(run_samples(), 1)
+        print(f"Calibration: {threads} threads -> {timings[threads]} ms")
+    
+    fastest = min(timings.values())
+    chosen = min(threads for threads, ms in timings.items() if ms <= fastest * (1 + CALIBRATION_TOLERANCE))
+    runtime = dict(_runtime_profile or apply_runtime_profile(model_dir))
+    runtime.update(_runtime_fingerprint())
+    runtime.update({
+        "threads": chosen,
+        "interopThreads": 1,
+        "calibrated": True,
+        "calibrationMs": {str(threads): ms for threads, ms in timings.items()},
+        "calibratedAt": time.strftime("%Y-%m-%dT%H:%M:%S")
+    })
+    save_runtime_profile(model_dir, runtime)
+    _set_torch_threads(chosen)
+    _runtime_profile = runtime
+    print(f"Using {chosen} torch threads (profile saved to {_runtime_profile_path(model_dir)})")
+    return runtime
+
+def _inference_context():
+    """torch.inference_mode where available (no autograd bookkeeping at all), else no_grad"""
+    import torch
+    mode = getattr(torch, "inference_mode", None) or getattr(torch, "no_grad", None)
+    return mode() if mode else nullcontext()
+
+def _optimize_model(model, model_name):
+    """Apply the opt-in BetterTransformer / torch.compile settings.
+
+    Returns (model, applied); an optimization that can't be applied is logged
+    and skipped, leaving the eager model.
+    """
+    applied = []
+    if _runtime_option("betterTransformer", BETTER_TRANSFORMER):
+        try:
+            from optimum.bettertransformer import BetterTransformer
+            model = BetterTransformer.transform(model)
+            applied.append("betterTransformer")
+        except Exception as e:
+            print(f"BetterTransformer not applied to {model_name}: {str(e)}")
+    if _runtime_option("compile", TORCH_COMPILE):
+        import torch
+        if hasattr(torch, "compile"):
+            try:
+                # generate() is a Python loop around forward(), so forward is what gets compiled
+                model.forward = torch.compile(model.forward, dynamic=True)
+                applied.append("compile")
+            except Exception as e:
+                print(f"torch.compile not applied to {model_name}: {str(e)}")
+        else:
+            print("torch.compile requires torch 2.0 or newer")
+    return model, applied
+
+def _load_model_from_disk(model_dir, model_name, backend=DEFAULT_BACKEND):
+    """Load (tokenizer, model, load_info) for model_name.
+
+    load_info records the weight format, load time and RSS before and after
+    loading, so the effect of the low-memory path can be measured.
+    """
+    model_path = _model_path(model_dir, model_name)
+    started = time.perf_counter()
+    rss_before = current_rss_bytes()
+    
+    print(f"Loading model and tokenizer from: {model_path}")
+    
+    # Check if directory exists
+    if not os.path.exists(model_path):
+        raise Exception(f"Model directory does not exist: {model_path}")
+    
+    # List files in directory
+    print("Files in model directory:")
+    for file in os.listdir(model_path):
+        file_path = os.path.join(model_path, file)
+        file_size = os.path.getsize(file_path)
+        print(f"  {file}: {file_size} bytes")
+    
+    # Load tokenizer with explicit local path
+    print(f"Loading tokenizer from {model_path}...")
+    transformers = _import_transformers(model_dir)
+    optimizations = []
+    # Prefer the Rust-backed tokenizer (tokenizer.json) where the model has one;
+    # AutoTokenizer falls back to the sentencepiece one otherwise (e.g. Marian)
+    with trace_stage("tokenizerLoad", model=model_name):
+        tokenizer = transformers.AutoTokenizer.from_pretrained(model_path, local_files_only=True, use_fast=True)
+    print(f"Tokenizer: {type(tokenizer).__name__} (fast: {getattr(tokenizer, 'is_fast', False)})")
+    
+    # Load model with explicit local path
+    weights_format = _weights_format(model_path)
+    print(f"Loading model from {model_path} (backend: {backend}, weights: {weights_format})...")
+    if backend == "onnx":
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        with trace_stage("modelLoad", model=model_name, backend=backend):
+            model = ORTModelForSeq2SeqLM.from_pretrained(export_onnx_model(model_path))
+        weights_format = "onnx"
+    else:
+        load_kwargs = {"local_files_only": True}
+        if LOW_MEMORY_LOAD:
+            load_kwargs["low_cpu_mem_usage"] = True
+            if weights_format == "safetensors":
+                load_kwargs["use_safetensors"] = True
+        with trace_stage("modelLoad", model=model_name, backend=backend):
+            model = transformers.AutoModelForSeq2SeqLM.from_pretrained(model_path, **load_kwargs)
+        if weights_format == "bin" and AUTO_CONVERT_SAFETENSORS:
+            try:
+                convert_to_safetensors(model_dir, model_name, model)
+            except Exception as e:
+                print(f"Failed to convert {model_name} to safetensors: {str(e)}")
+        if _runtime_profile is None:
+            apply_runtime_profile(model_dir)
+        if backend == "quantized":
+            model = _quantize_dynamic(model)
+        else:
+            model, optimizations = _optimize_model(model, model_name)
+    
+    rss_after = current_rss_bytes()
+    load_info = {
+        "weights": weights_format,
+        "fastTokenizer": bool(getattr(tokenizer, "is_fast", False)),
+        "lowMemory": LOW_MEMORY_LOAD,
+        "optimizations": optimizations,
+        "loadMs": round((time.perf_counter() - started) * 1000, 1),
+        "rssBeforeMB": _to_mb(rss_before),
+        "rssAfterMB": _to_mb(rss_after),
+        "peakRssMB": _to_mb(peak_rss_bytes())
+    }
+    print(f"Loaded {model_name} in {load_info['loadMs']} ms, "
+          f"RSS {load_info['rssBeforeMB']} -> {load_info['rssAfterMB']} MB")
+    return tokenizer, model, load_info
+
+def _estimate_model_bytes(model, model_path):
+    """Approximate resident size of a model.
+
+    Uses parameters and buffers for torch models, and falls back to the size
+    of the weight files on disk for models that don't expose them (ONNX).
+    """
+    try:
+        tensors = list(model.parameters()) + list(model.buffers())
+        size = sum(t.numel() * t.element_size() for t in tensors)
+        if size:
+            return size
+    except Exception:
+        pass
+    
+    size = 0
+    for root, _, files in os.walk(model_path):
+        for file in files:
+            if file.endswith((".bin", ".safetensors", ".onnx", ".onnx_data")):
+                size += os.path.getsize(os.path.join(root, file))
+    return size
+
+class ModelRegistry:
+    """In-process cache of loaded (tokenizer, model) pairs.
+
+    Entries are keyed by (model name, backend).
+    Models stay resident between requests, so switching translation direction
+    never reloads from disk. When the estimated size of all resident models
+    exceeds the memory budget, the least recently used ones are evicted. The
+    model being requested is never evicted, even if it alone is over budget.
+    """
+    
+    def __init__(self, model_dir, memory_budget_mb=DEFAULT_MODEL_MEMORY_MB):
+        self.model_dir = model_dir
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self._models = OrderedDict()
+        self._lock = threading.RLock()
+        self.loads = 0
+        self.evictions = 0
+    
+    def get(self, model_name, backend=DEFAULT_BACKEND):
+        """Return (tokenizer, model) for model_name, loading it if needed"""
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend: {backend}")
         
-        # List files in directory
-        print("Files in model directory:")
-        for file in os.listdir(model_path):
-            file_path = os.path.join(model_path, file)
-            file_size = os.path.getsize(file_path)
-            print(f"  {file}: {file_size} bytes")
+        key = (model_name, backend)
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                self._models.move_to_end(key)
+                return entry["tokenizer"], entry["model"]
+            
+            tokenizer, model, load_info = _load_model_from_disk(self.model_dir, model_name, backend)
+            self.loads += 1
+            self._models[key] = {
+                "tokenizer": tokenizer,
+                "model": model,
+                "size": _estimate_model_bytes(model, _model_path(self.model_dir, model_name)),
+                "load": load_info
+            }
+            self._evict_over_budget()
+            return tokenizer, model
+    
+    def preload(self, model_names, backend=DEFAULT_BACKEND):
+        for model_name in model_names:
+            try:
+                self.get(model_name, backend)
+            except Exception as e:
+                print(f"Failed to preload {model_name}: {str(e)}")
+    
+    def evict(self, key):
+        with self._lock:
+            if self._models.pop(key, None) is not None:
+                self.evictions += 1
+                print(f"Evicted model from registry: {key[0]} ({key[1]})")
+    
+    def evict_all(self):
+        with self._lock:
+            for key in list(self._models):
+                self.evict(key)
+    
+    def resident_bytes(self):
+        with self._lock:
+            return sum(entry["size"] for entry in self._models.values())
+    
+    def stats(self):
+        with self._lock:
+            return {
+                "models": [f"{model_name} ({backend})" for model_name, backend in self._models],
+                "loadInfo": {f"{model_name} ({backend})": entry["load"]
+                             for (model_name, backend), entry in self._models.items()},
+                "residentMB": round(self.resident_bytes() / 1024 / 1024, 1),
+                "budgetMB": round(self.memory_budget / 1024 / 1024, 1),
+                "loads": self.loads,
+                "evictions": self.evictions
+            }
+    
+    def _evict_over_budget(self):
+        while len(self._models) > 1 and self.resident_bytes() > self.memory_budget:
+            oldest = next(iter(self._models))
+            self.evict(oldest)
+
+# One registry per model directory for the lifetime of the process
+_registries = {}
+
+def get_registry(model_dir, memory_budget_mb=DEFAULT_MODEL_MEMORY_MB):
+    registry = _registries.get(model_dir)
+    if registry is None:
+        registry = ModelRegistry(model_dir, memory_budget_mb)
+        _registries[model_dir] = registry
+    return registry
+
+# Translation cache size limit (MB of stored text); 0 disables the cache
+DEFAULT_CACHE_MAX_MB = float(os.environ.get("TRANSLATE_CACHE_MAX_MB", "64"))
+CACHE_FILE_NAME = "translation_cache.sqlite3"
+
+def _normalize_for_cache(text):
+    """Canonical form of a segment used for the cache key"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+class TranslationCache:
+    """Persistent segment translation cache backed by SQLite.
+
+    Entries are keyed by (sha256 of the normalized source text, model name,
+    generation settings). When the stored text grows past max_bytes the least
+    recently used entries are dropped. Hit/miss counters cover the lifetime
+    of this process.
+    """
+    
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            " text_hash TEXT NOT NULL,"
+            " model TEXT NOT NULL,"
+            " settings TEXT NOT NULL,"
+            " translation TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (text_hash, model, settings))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used)")
+        self._conn.commit()
+    
+    @staticmethod
+    def _hash(text):
+        return hashlib.sha256(_normalize_for_cache(text).encode("utf-8")).hexdigest()
+    
+    @staticmethod
+    def settings_key(settings):
+        return json.dumps(settings or {}, sort_keys=True)
+    
+    def get_many(self, model_name, settings, texts):
+        """Return cached translations for texts, None for each miss"""
+        settings = self.settings_key(settings)
+        hashes = [self._hash(text) for text in texts]
+        found = {}
+        with self._lock:
+            for text_hash in set(hashes):
+                row = self._conn.execute(
+                    "SELECT translation FROM translations WHERE text_hash = ? AND model = ? AND settings = ?",
+                    (text_hash, model_name, settings)
+                ).fetchone()
+                if row is not None:
+                    found[text_hash] = row[0]
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE translations SET last_used = ? WHERE text_hash = ? AND model = ? AND settings = ?",
+                    [(now, text_hash, model_name, settings) for text_hash in found]
+                )
+                self._conn.commit()
+            results = [found.get(text_hash) for text_hash in hashes]
+            hit_count = sum(1 for result in results if result is not None)
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+        return results
+    
+    def put_many(self, model_name, settings, pairs):
+        """Store (source text, translation) pairs and evict if over budget"""
+        settings = self.settings_key(settings)
+        now = time.time()
+        rows = [
+            (self._hash(text), model_name, settings, translation,
+             len(text.encode("utf-8")) + len(translation.encode("utf-8")), now)
+            for text, translation in pairs
+        ]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._evict_over_budget()
+            self._conn.commit()
+    
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM translations").fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "sizeMB": round(size / 1024 / 1024, 2),
+            "maxMB": round(self.max_bytes / 1024 / 1024, 2)
+        }
+    
+    def _evict_over_budget(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM translations").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Trim to 90% of the budget so eviction doesn't run on every insert
+        excess = total - int(self.max_bytes * 0.9)
+        freed = 0
+        stale = []
+        for rowid, size in self._conn.execute("SELECT rowid, size FROM translations ORDER BY last_used"):
+            stale.append((rowid,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM translations WHERE rowid = ?", stale)
+        print(f"Evicted {len(stale)} entries from translation cache")
+
+# One cache per model directory; None when caching is disabled or unavailable
+_caches = {}
+
+def get_cache(model_dir, max_mb=DEFAULT_CACHE_MAX_MB):
+    if model_dir not in _caches:
+        cache = None
+        if max_mb > 0:
+            # The cache file lives next to the translation_models directory
+            cache_dir = os.path.dirname(os.path.abspath(model_dir))
+            try:
+                cache = TranslationCache(os.path.join(cache_dir, CACHE_FILE_NAME), max_mb * 1024 * 1024)
+            except Exception as e:
+                print(f"Translation cache unavailable: {str(e)}")
+        _caches[model_dir] = cache
+    return _caches[model_dir]
+
+# Upper bounds for one generate call: rows per batch, and padded tokens
+# (rows x longest row) so a bucket of long inputs doesn't blow up memory
+DEFAULT_BATCH_SIZE = 16
+DEFAULT_MAX_BATCH_TOKENS = 4096
+
+def _length_buckets(lengths, batch_size=DEFAULT_BATCH_SIZE, max_batch_tokens=DEFAULT_MAX_BATCH_TOKENS):
+    """Group indices into batches of similar token length.
+
+    Indices are sorted by length so each batch only pads up to its own
+    longest member. A batch is closed when it reaches batch_size rows or when
+    adding the next (longest so far) row would exceed max_batch_tokens padded
+    tokens.
+    """
+    buckets = []
+    current = []
+    for index in sorted(range(len(lengths)), key=lambda i: lengths[i]):
+        padded_tokens = (len(current) + 1) * lengths[index]
+        if current and (len(current) >= batch_size or padded_tokens > max_batch_tokens):
+            buckets.append(current)
+            current = []
+        current.append(index)
+    if current:
+        buckets.append(current)
+    return buckets
+
+# Named decoding profiles. The generation budget scales with the input:
+# max_new_tokens = length_ratio * longest input in the bucket + length_slack,
+# capped at max_new_tokens_cap, instead of Marian's default max length of 512.
+DECODING_PROFILES = {
+    "fast": {"num_beams": 1, "length_ratio": 1.5, "length_slack": 8, "max_new_tokens_cap": 256},
+    "balanced": {"num_beams": 2, "length_ratio": 2.0, "length_slack": 16, "max_new_tokens_cap": 384},
+    "quality": {"num_beams": 4, "length_ratio": 2.5, "length_slack": 32, "max_new_tokens_cap": 512}
+}
+DEFAULT_PROFILE = os.environ.get("TRANSLATE_PROFILE", "quality")
+# Requests with a latency budget below this (ms) are decoded with "fast"
+FAST_PROFILE_BUDGET_MS = 1500
+
+def resolve_profile(profile=None, latency_budget_ms=None):
+    """Pick the decoding profile for a request"""
+    name = profile or DEFAULT_PROFILE
+    if name not in DECODING_PROFILES:
+        raise ValueError(f"Unknown decoding profile: {name}")
+    if latency_budget_ms is not None and latency_budget_ms < FAST_PROFILE_BUDGET_MS:
+        name = "fast"
+    return name
+
+def _generation_kwargs(profile_name, input_length, deadline=None):
+    profile = DECODING_PROFILES[profile_name]
+    max_new_tokens = min(profile["max_new_tokens_cap"],
+                         int(input_length * profile["length_ratio"]) + profile["length_slack"])
+    kwargs = {
+        "num_beams": profile["num_beams"],
+        "do_sample": False,
+        "max_new_tokens": max_new_tokens
+    }
+    if deadline is not None:
+        # generate stops once max_time seconds have passed
+        kwargs["max_time"] = max(deadline - time.monotonic(), 0.01)
+    return kwargs
+
+# Token ids of recently seen segments, per model. Game descriptions repeat a
+# lot of boilerplate sentences, and the sentencepiece tokenizer Marian
+# models use is slow Python code for long inputs.
+TOKENIZATION_CACHE_SIZE = int(os.environ.get("TRANSLATE_TOKENIZATION_CACHE_SIZE", "4096"))
+
+class TokenizationCache:
+    """LRU cache of input_ids keyed by (model name, text)"""
+    
+    def __init__(self, max_entries=TOKENIZATION_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def encode(self, tokenizer, model_name, texts):
+        """input_ids for every text; only texts not seen recently go through the tokenizer"""
+        with self._lock:
+            encoded = []
+            for text in texts:
+                ids = self._entries.get((model_name, text))
+                if ids is not None:
+                    self._entries.move_to_end((model_name, text))
+                encoded.append(ids)
         
-        # Load tokenizer with explicit local path
-        print(f"Loading tokenizer from {model_path}...")
-        tokenizer = AutoTokenizer.from_pretrained(model_path, local_files_only=True)
+        missing = list(dict.fromkeys(text for text, ids in zip(texts, encoded) if ids is None))
+        fresh = {}
+        if missing:
+            fresh = dict(zip(missing, tokenizer(missing, truncation=True)["input_ids"]))
         
-        # Load model with explicit local path
-        print(f"Loading model from {model_path}...")
-        model = AutoModelForSeq2SeqLM.from_pretrained(model_path, local_files_only=True)
+        with self._lock:
+            self.hits += len(texts) - sum(1 for ids in encoded if ids is None)
+            self.misses += len(missing)
+            if self.max_entries > 0:
+                for text, ids in fresh.items():
+                    self._entries[(model_name, text)] = ids
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return [ids if ids is not None else fresh[text] for text, ids in zip(texts, encoded)]
+    
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "maxEntries": self.max_entries,
+                    "hits": self.hits, "misses": self.misses}
+
+_tokenization_cache = TokenizationCache()
+
+class TranslationCancelled(Exception):
+    """Raised when should_stop() asks a running translation to give up"""
+    pass
+
+def _stopping_criteria(should_stop):
+    """StoppingCriteriaList that ends generate as soon as should_stop() returns True"""
+    transformers = _transformers
+    if should_stop is None or not hasattr(transformers, "StoppingCriteria"):
+        return None
+    
+    # Since transformers 4.39 criteria return one flag per row instead of a bool
+    version = tuple(int(part) for part in re.findall(r'\d+', transformers.__version__)[:2])
+    per_row = version >= (4, 39)
+    
+    class ShouldStop(transformers.StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs):
+            stop = bool(should_stop())
+            if not per_row:
+                return stop
+            import torch
+            return torch.full((input_ids.shape[0],), stop, dtype=torch.bool, device=input_ids.device)
+    
+    return transformers.StoppingCriteriaList([ShouldStop()])
+
+def generate_batch(texts, model_dir, model_name, batch_size=DEFAULT_BATCH_SIZE,
+                   max_batch_tokens=DEFAULT_MAX_BATCH_TOKENS, backend=DEFAULT_BACKEND,
+                   profile=DEFAULT_PROFILE, deadline=None, stats=None, on_result=None, should_stop=None):
+    """Translate texts with a single model, one generate call per length bucket.
+
+    Inputs are tokenized without padding, bucketed by token length and padded
+    per bucket only. Results come back in the order of texts. deadline is a
+    time.monotonic() value after which decoding is cut short. If a stats dict
+    is given it receives "tokensGenerated" (one count per text) and
+    "decodeMs" (total time spent in generate). on_result(index, translation)
+    is called for each text as soon as its bucket has been decoded.
+    should_stop(), if given, is polled between buckets and during decoding;
+    once it returns True the call raises TranslationCancelled.
+    """
+    tokenizer, model = get_registry(model_dir).get(model_name, backend)
+    stopping_criteria = _stopping_criteria(should_stop)
+    results = [""] * len(texts)
+    tokens_generated = [0] * len(texts)
+    decode_seconds = 0.0
+    
+    # Empty strings have nothing to translate
+    pending = [i for i, text in enumerate(texts) if text.strip()]
+    if pending:
+        with trace_stage("tokenize"):
+            encoded = _tokenization_cache.encode(tokenizer, model_name, [texts[i] for i in pending])
+        lengths = [len(ids) for ids in encoded]
         
+        for bucket in _length_buckets(lengths, batch_size, max_batch_tokens):
+            with trace_stage("tokenize"):
+                features = [{"input_ids": encoded[i], "attention_mask": [1] * lengths[i]} for i in bucket]
+                inputs = tokenizer.pad(features, padding=True, return_tensors="pt")
+            generation_kwargs = _generation_kwargs(profile, max(lengths[i] for i in bucket), deadline)
+            if stopping_criteria is not None:
+                generation_kwargs["stopping_criteria"] = stopping_criteria
+            
+            if should_stop and should_stop():
+                raise TranslationCancelled()
+            started = time.perf_counter()
+            with trace_stage("generate", model=model_name, rows=len(bucket)), _inference_context():
+                outputs = model.generate(**inputs, **generation_kwargs)
+            decode_seconds += time.perf_counter() - started
+            # Output cut short by the stopping criteria is not a translation
+            if should_stop and should_stop():
+                raise TranslationCancelled()
+            
+            with trace_stage("detokenize"):
+                decoded = tokenizer.batch_decode(outputs, skip_special_tokens=True)
+            # Output rows start with the decoder start token, which for Marian is the pad token
+            for i, translated_text, row in zip(bucket, decoded, outputs.tolist()):
+                results[pending[i]] = translated_text
+                tokens_generated[pending[i]] = sum(1 for token in row if token != tokenizer.pad_token_id)
+                if on_result:
+                    on_result(pending[i], translated_text)
+    
+    if stats is not None:
+        stats["tokensGenerated"] = tokens_generated
+        stats["decodeMs"] = stats.get("decodeMs", 0.0) + decode_seconds * 1000
+    return results
+
+def translate_text(text, model_dir, model_name, backend=DEFAULT_BACKEND):
+    try:
         # Translate text
         print(f"Translating text: {text}")
-        inputs = tokenizer(text, return_tensors="pt", padding=True)
-        outputs = model.generate(**inputs)
-        translated_text = tokenizer.batch_decode(outputs, skip_special_tokens=True)[0]
+        translated_text = generate_batch([text], model_dir, model_name, backend=backend)[0]
         
         print(f"Translation result: {translated_text}")
         return translated_text
@@ -98,14 +1103,1397 @@ def translate_text(text, model_dir, model_name):
         print(f"Error during translation: {str(e)}")
         raise
 
+# Script-ratio language detection. Runs of Han characters and of Latin
+# letters are counted with compiled regexes (the scanning happens in C), and
+# text counts as Chinese when Han characters make up at least
+# CJK_RATIO_THRESHOLD of the weighted letters. A Han character carries about
+# as much text as CJK_CHAR_WEIGHT Latin letters, so Chinese sentences full of
+# English product names still count as Chinese. A short Han run (a name or
+# title, possibly joined by a colon or middle dot as in 黑神话：悟空) with Latin
+# words right before and after it is part of an English sentence and is left
+# out of the count. So is the only Han run of a text where Latin letters
+# outweigh it, wherever it sits ("原神 is back.").
+_CJK_CHARS = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+_CJK_RUN_RE = re.compile(f'[{_CJK_CHARS}]+(?:[：:·・][{_CJK_CHARS}]+)*')
+_CJK_CHAR_RE = re.compile(f'[{_CJK_CHARS}]')
+_LATIN_RUN_RE = re.compile(r'[A-Za-z\u00c0-\u024f]+')
+CJK_RATIO_THRESHOLD = 0.2
+CJK_CHAR_WEIGHT = 3
+EMBEDDED_CJK_MAX_CHARS = 8
+
+def _script_counts(text):
+    runs = sorted([(m.start(), "latin", len(m.group())) for m in _LATIN_RUN_RE.finditer(text)] +
+                  [(m.start(), "cjk", len(_CJK_CHAR_RE.findall(m.group()))) for m in _CJK_RUN_RE.finditer(text)])
+    cjk = latin = 0
+    cjk_runs = []
+    for i, (_, script, length) in enumerate(runs):
+        if script == "latin":
+            latin += length
+        else:
+            cjk_runs.append(length)
+            if not (length <= EMBEDDED_CJK_MAX_CHARS and 0 < i < len(runs) - 1
+                    and runs[i - 1][1] == runs[i + 1][1] == "latin"):
+                cjk += length
+    if len(cjk_runs) == 1 and cjk_runs[0] <= EMBEDDED_CJK_MAX_CHARS and latin >= cjk * CJK_CHAR_WEIGHT:
+        cjk = 0
+    return cjk, latin
+
+def segment_language(text):
+    """"zh" or "en" by script ratio, or None when text has no letters at all
+
+    >>> segment_language("Travel to 提瓦特 and find your sibling.")
+    'en'
+    >>> segment_language("Play 黑神话：悟空 now.")
+    'en'
+    >>> segment_language("Explore the vast world of 原神.")
+    'en'
+    >>> segment_language("原神 is back.")
+    'en'
+    >>> segment_language("我在Steam上买了Elden Ring")
+    'zh'
+    >>> segment_language("Steam版本。支持中文。Xbox")
+    'zh'
+    >>> segment_language("2024")
+    """
+    cjk, latin = _script_counts(text)
+    if not cjk and not latin:
+        return None
+    weighted = cjk * CJK_CHAR_WEIGHT
+    return "zh" if weighted / (weighted + latin) >= CJK_RATIO_THRESHOLD else "en"
+
 def detect_language(text):
-    # Improved language detection - check for Chinese characters
-    for char in text:
-        if '\u4e00' <= char <= '\u9fff':
-            return "zh"
-    return "en"
+    return segment_language(text) or "en"
+
+def detect_languages(texts):
+    """detect_language for a whole batch; repeated texts are only scanned once"""
+    detected = {}
+    for text in texts:
+        if text not in detected:
+            detected[text] = detect_language(text)
+    return [detected[text] for text in texts]
+
+def default_language_pairs(zh_en_model, en_zh_model):
+    """Map "source-target" language pairs to the model that translates them"""
+    return {
+        "zh-en": zh_en_model,
+        "en-zh": en_zh_model
+    }
+
+# Sentence terminators. Chinese punctuation ends a sentence by itself; English
+# terminators must be followed by whitespace so decimals like "1.5" and
+# dotted names like "Node.js" stay intact. Closing quotes/brackets stay with
+# the sentence they close.
+_SENTENCE_END_RE = re.compile(r'[。！？；…]+[”’」』）)]*|[.!?]+["\'”’)\]]*(?=\s)')
+# A "." after an initial ("J. Smith"), a dotted initialism ("U.S.", "e.g.")
+# or one of these abbreviations doesn't end the sentence
+_ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "prof", "st", "jr", "sr", "vs", "vol", "fig", "approx",
+                  "inc", "ltd", "corp", "dept", "mt", "ft", "pp", "ch", "ep", "pt"}
+_WORD_BEFORE_PERIOD_RE = re.compile(r'(?<![A-Za-z.])[A-Za-z]+(?:\.[A-Za-z]+)*$')
+# Softer break points used to cut sentences that are still too long
+_CLAUSE_BREAK_RE = re.compile(r'[，、：,;:]\s*|\s+')
+# Longest segment sent to the model. Keeps each sequence well inside the
+# Marian max length and bounds the quadratic attention cost per sequence.
+MAX_SEGMENT_CHARS = 300
+
+Segment = namedtuple("Segment", ["start", "end", "paragraph"])
+
+def _is_abbreviation(text, match):
+    """True if the sentence-end match is only the period of an abbreviation"""
+    if match.group() != ".":
+        return False
+    word = _WORD_BEFORE_PERIOD_RE.search(text, max(0, match.start() - 32), match.start())
+    if word is None:
+        return False
+    word = word.group()
+    return "." in word or (len(word) == 1 and word.isupper()) or word.lower() in _ABBREVIATIONS
+
+def _split_long_span(text, start, end, max_chars):
+    """Cut text[start:end] into pieces of at most max_chars at clause breaks"""
+    pieces = []
+    while end - start > max_chars:
+        cut = None
+        for match in _CLAUSE_BREAK_RE.finditer(text, start, start + max_chars):
+            if match.end() > start:
+                cut = match.end()
+        if cut is None:
+            cut = start + max_chars
+        # The break's whitespace belongs to neither piece
+        piece_end = cut
+        while piece_end > start and text[piece_end - 1].isspace():
+            piece_end -= 1
+        pieces.append((start, piece_end))
+        start = cut
+    pieces.append((start, end))
+    return pieces
+
+def segment_text(text, max_chars=MAX_SEGMENT_CHARS):
+    """Split text into sentence segments for translation.
+
+    Every non-blank line is a paragraph; each paragraph is split at Chinese
+    and English sentence punctuation, and sentences longer than max_chars are
+    cut further at clause breaks. Returns Segments holding start/end offsets
+    into text (surrounding whitespace excluded) and the paragraph index.
+    
+    >>> text = "Dr. Smith went home. U.S. army vs. Vol. 2, e.g. this one."
+    >>> [text[segment.start:segment.end] for segment in segment_text(text)]
+    ['Dr. Smith went home.', 'U.S. army vs. Vol. 2, e.g. this one.']
+    >>> text = "one two three four five"
+    >>> [text[segment.start:segment.end] for segment in segment_text(text, max_chars=10)]
+    ['one two', 'three', 'four five']
+    """
+    segments = []
+    for paragraph, line in enumerate(re.finditer(r'[^\n]*\S[^\n]*', text)):
+        spans = []
+        start = line.start()
+        for match in _SENTENCE_END_RE.finditer(text, line.start(), line.end()):
+            if _is_abbreviation(text, match):
+                continue
+            spans.append((start, match.end()))
+            start = match.end()
+        spans.append((start, line.end()))
+        
+        for span_start, span_end in spans:
+            # Trim whitespace so offsets point at the sentence itself
+            while span_start < span_end and text[span_start].isspace():
+                span_start += 1
+            while span_end > span_start and text[span_end - 1].isspace():
+                span_end -= 1
+            if span_start == span_end:
+                continue
+            for piece_start, piece_end in _split_long_span(text, span_start, span_end, max_chars):
+                segments.append(Segment(piece_start, piece_end, paragraph))
+    return segments
+
+def join_segments(text, segments, translations, target_language):
+    """Reassemble translated segments, keeping the original paragraph breaks.
+
+    Sentences within a paragraph are joined with a space for languages that
+    separate words, and directly for Chinese.
+    """
+    joiner = "" if target_language == "zh" else " "
+    parts = []
+    previous = None
+    for segment, translated_text in zip(segments, translations):
+        if previous is not None:
+            if segment.paragraph != previous.paragraph:
+                parts.append("\n" * text.count("\n", previous.end, segment.start))
+            else:
+                parts.append(joiner)
+        parts.append(translated_text.strip())
+        previous = segment
+    return "".join(parts)
+
+def handle_translation(text, model_dir, language_pairs, target_language=None, backend=DEFAULT_BACKEND,
+                       profile=None, latency_budget_ms=None, on_partial=None, should_stop=None):
+    """Translate one text and build the result dict shared by CLI and server mode.
+
+    on_partial, if given, receives a partial_event dict per translated segment.
+    should_stop is passed on to translate_batch.
+    """
+    print(f"Translating text: {text}")
+    on_segment = None
+    if on_partial:
+        def on_segment(_, segment_index, segment, translation):
+            on_partial(partial_event(segment_index, segment, translation))
+    
+    result = translate_batch([text], model_dir, language_pairs, target_language, backend=backend,
+                             profile=profile, latency_budget_ms=latency_budget_ms, on_segment=on_segment,
+                             should_stop=should_stop)[0]
+    print(f"Translation result: {result['translatedText']}")
+    return result
+
+def translate_batch(texts, model_dir, language_pairs, target_language=None,
+                    batch_size=DEFAULT_BATCH_SIZE, max_batch_tokens=DEFAULT_MAX_BATCH_TOKENS,
+                    backend=DEFAULT_BACKEND, profile=None, latency_budget_ms=None, on_segment=None,
+                    should_stop=None):
+    """Translate many texts at once.
+
+    Every text is split into sentence segments (see segment_text), segments
+    are grouped by translation direction, and each group goes through
+    generate_batch. A whole search result page of long descriptions therefore
+    costs a few bucketed generate calls over short sequences. Segments found
+    in the translation cache skip the model entirely.
+
+    profile names a DECODING_PROFILES entry; latency_budget_ms (optional)
+    downgrades to "fast" when tight and bounds the total generate time.
+    Translations produced under a budget may be cut short, so they are not
+    written to the cache. Returns one result dict per input text, in the
+    original order, with per-text cache hit/miss counts, generated token
+    counts and the decode time of its direction's generate calls.
+
+    Segments are routed by their own language (segment_language), so a
+    mixed text is translated sentence by sentence with the right model.
+    Segments already in the target language are copied through untranslated
+    and counted in "passthrough"; a text entirely in the target language
+    never reaches a model.
+
+    on_segment(text_index, segment_index, segment, translation), if given, is
+    called for every segment as soon as its translation is known: cached
+    segments first, then each generated length bucket as it finishes. Calls
+    are therefore not in text order; the Segment offsets locate each piece.
+
+    should_stop(), if given, is checked before and during generation; when it
+    returns True the call raises TranslationCancelled and nothing new is
+    cached.
+
+    Every result also carries "timings": milliseconds per stage (segmentation,
+    cache, tokenize, generate, ...) for the whole call, so texts translated
+    together report the same numbers.
+    """
+    tracer = Tracer()
+    with tracer.activate():
+        results = _translate_batch(texts, model_dir, language_pairs, target_language, batch_size,
+                                   max_batch_tokens, backend, profile, latency_budget_ms, on_segment,
+                                   should_stop)
+    timings = tracer.summary()
+    for result in results:
+        result["timings"] = timings
+    return results
+
+def _translate_batch(texts, model_dir, language_pairs, target_language, batch_size, max_batch_tokens,
+                     backend, profile, latency_budget_ms, on_segment, should_stop):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend: {backend}")
+    
+    profile = resolve_profile(profile, latency_budget_ms)
+    deadline = None
+    if latency_budget_ms is not None:
+        deadline = time.monotonic() + latency_budget_ms / 1000
+    
+    cache = get_cache(model_dir)
+    # Backends and profiles don't produce identical output, so they are cached separately
+    settings = {"profile": profile}
+    if backend != "torch":
+        settings["backend"] = backend
+    results = []
+    segments_by_text = []
+    translations_by_text = []
+    groups = OrderedDict()
+    
+    with trace_stage("segmentation"):
+        languages = detect_languages(texts)
+    
+    for index, (text, lang) in enumerate(zip(texts, languages)):
+        target = target_language or ("en" if lang == "zh" else "zh")
+        with trace_stage("segmentation"):
+            segments = segment_text(text)
+        
+        results.append({
+            "translatedText": "",
+            "sourceLanguage": lang,
+            "targetLanguage": target,
+            "backend": backend,
+            "cache": {"hits": 0, "misses": 0},
+            "passthrough": 0,
+            "decoding": {"profile": profile, "tokensGenerated": 0, "decodeMs": 0.0}
+        })
+        segments_by_text.append(segments)
+        translations = [None] * len(segments)
+        translations_by_text.append(translations)
+        
+        # Each sentence is routed by its own language, so mixed text uses the
+        # right model per sentence. Sentences already in the target language
+        # (or without letters) are kept as they are.
+        for segment_index, segment in enumerate(segments):
+            source = text[segment.start:segment.end]
+            segment_lang = segment_language(source)
+            if segment_lang is None or segment_lang == target:
+                translations[segment_index] = source
+                results[index]["passthrough"] += 1
+                if on_segment:
+                    on_segment(index, segment_index, segment, source)
+            else:
+                groups.setdefault((segment_lang, target), []).append((index, segment_index, segment))
+    
+    for (lang, target), items in groups.items():
+        model_name = language_pairs.get(f"{lang}-{target}")
+        if not model_name:
+            raise ValueError(f"No model configured for {lang} -> {target}")
+        
+        sources = [texts[i][segment.start:segment.end] for i, _, segment in items]
+        with trace_stage("cacheLookup"):
+            translated = cache.get_many(model_name, settings, sources) if cache else [None] * len(sources)
+        
+        # Only segments missing from the cache reach the model, each distinct one once
+        waiting = OrderedDict()
+        for item, source, hit in zip(items, sources, translated):
+            if hit is None:
+                waiting.setdefault(source, []).append(item)
+            elif on_segment:
+                on_segment(item[0], item[1], item[2], hit)
+        missing = list(waiting)
+        print(f"Translating {len(items)} segments {lang} -> {target} with model: {model_name} "
+              f"({len(sources) - translated.count(None)} cached, {len(missing)} to generate)")
+        
+        def segment_done(missing_index, translated_text):
+            for index, segment_index, segment in waiting[missing[missing_index]]:
+                on_segment(index, segment_index, segment, translated_text)
+        
+        generation_stats = {"tokensGenerated": [], "decodeMs": 0.0}
+        if missing:
+            outputs = generate_batch(missing, model_dir, model_name, batch_size, max_batch_tokens,
+                                     backend, profile, deadline, generation_stats,
+                                     segment_done if on_segment else None, should_stop)
+            generated = dict(zip(missing, outputs))
+            generated_tokens = dict(zip(missing, generation_stats["tokensGenerated"]))
+            if cache and deadline is None:
+                with trace_stage("cacheWrite"):
+                    cache.put_many(model_name, settings, generated.items())
+        
+        for (index, segment_index, _), source, hit in zip(items, sources, translated):
+            decoding = results[index]["decoding"]
+            if hit is None:
+                translations_by_text[index][segment_index] = generated[source]
+                results[index]["cache"]["misses"] += 1
+                decoding["tokensGenerated"] += generated_tokens[source]
+            else:
+                translations_by_text[index][segment_index] = hit
+                results[index]["cache"]["hits"] += 1
+        
+        for index in dict.fromkeys(index for index, _, _ in items):
+            decoding = results[index]["decoding"]
+            decoding["decodeMs"] = round(decoding["decodeMs"] + generation_stats["decodeMs"], 1)
+    
+    with trace_stage("join"):
+        for index, text in enumerate(texts):
+            results[index]["translatedText"] = join_segments(
+                text, segments_by_text[index], translations_by_text[index], results[index]["targetLanguage"])
+    
+    return results
+
+# Texts handed to a pool worker per dispatch
+DEFAULT_POOL_CHUNK_SIZE = 16
+
+def _set_torch_threads(threads):
+    import torch
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Can only be set once, before any inter-op parallel work started
+        pass
+
+# Per-process settings of a pool worker, filled in by _pool_worker_init
+_pool_worker_settings = None
+
+def _pool_worker_init(model_dir, language_pairs, threads, backend, profile, cache_max_mb, model_memory_mb):
+    global _pool_worker_settings
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    # SQLite connections must not be shared across a fork; each worker opens its own
+    _caches.clear()
+    get_cache(model_dir, cache_max_mb)
+    _import_transformers(model_dir)
+    apply_runtime_profile(model_dir, threads)
+    # With fork the models are already resident (inherited copy-on-write);
+    # with spawn each worker loads its own copy here
+    get_registry(model_dir, model_memory_mb).preload(dict.fromkeys(language_pairs.values()), backend)
+    _pool_worker_settings = (model_dir, language_pairs, backend, profile)
+
+def _pool_worker_translate(job):
+    texts, target_language = job
+    model_dir, language_pairs, backend, profile = _pool_worker_settings
+    return translate_batch(texts, model_dir, language_pairs, target_language, backend=backend, profile=profile)
+
+class TranslationPool:
+    """Pool of translator processes for bulk throughput on multi-core hosts.
+
+    A single torch process doesn't scale with cores for small batches, so the
+    work is spread over several processes, each pinned to its own share of
+    intra-op threads. Where fork is available the parent loads the models
+    before starting the workers and they share the weight pages read-only
+    (copy-on-write); elsewhere each worker loads its own copy. The pool must
+    be created before the parent process runs any inference itself, since
+    forking after OpenMP has started is unsafe.
+    """
+    
+    def __init__(self, model_dir, language_pairs, workers, threads_per_worker=None,
+                 backend=DEFAULT_BACKEND, profile=DEFAULT_PROFILE, chunk_size=DEFAULT_POOL_CHUNK_SIZE,
+                 cache_max_mb=DEFAULT_CACHE_MAX_MB, model_memory_mb=DEFAULT_MODEL_MEMORY_MB):
+        import multiprocessing
+        
+        self.workers = max(1, int(workers))
+        self.threads_per_worker = threads_per_worker or max(1, default_thread_count() // self.workers)
+        self.chunk_size = chunk_size
+        
+        start_method = "fork" if "fork" in multiprocessing.get_all_start_methods() and sys.platform != "darwin" else "spawn"
+        if start_method == "fork":
+            get_registry(model_dir, model_memory_mb).preload(dict.fromkeys(language_pairs.values()), backend)
+        
+        print(f"Starting translation pool: {self.workers} workers x {self.threads_per_worker} threads ({start_method})")
+        context = multiprocessing.get_context(start_method)
+        self._pool = context.Pool(
+            self.workers,
+            initializer=_pool_worker_init,
+            initargs=(model_dir, language_pairs, self.threads_per_worker, backend, profile,
+                      cache_max_mb, model_memory_mb)
+        )
+    
+    def translate_batch(self, texts, target_language=None):
+        """Dispatch texts to the workers in chunks; results keep the input order"""
+        # Small batches are split evenly so every worker gets a share
+        chunk_size = max(1, min(self.chunk_size, -(-len(texts) // self.workers)))
+        jobs = [(texts[i:i + chunk_size], target_language) for i in range(0, len(texts), chunk_size)]
+        results = []
+        for chunk_results in self._pool.imap(_pool_worker_translate, jobs):
+            results.extend(chunk_results)
+        return results
+    
+    def stats(self):
+        return {"workers": self.workers, "threadsPerWorker": self.threads_per_worker}
+    
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+# Fixed benchmark corpus: short UI strings and long game descriptions in both
+# directions. Keep it unchanged so results stay comparable between releases.
+BENCHMARK_CORPUS = {
+    "zh": {
+        "short": [
+            "开始游戏",
+            "继续",
+            "设置",
+            "保存进度",
+            "返回主菜单",
+            "确定要退出游戏吗？",
+            "音量",
+            "读取存档失败",
+            "已解锁新成就",
+            "下载完成"
+        ],
+        "long": [
+            "这是一款以蒸汽朋克城市为舞台的角色扮演游戏。玩家将扮演一名失去记忆的机械师，在错综复杂的街巷中寻找自己的过去。"
+            "游戏拥有超过四十小时的主线剧情，数十个可招募的同伴，以及会根据玩家选择而改变的多重结局。",
+            "在这款合作生存游戏中，你和最多三名好友将被困在一座不断变化的岛屿上。白天需要采集资源、建造营地，"
+            "夜晚则要抵御从雾中涌出的怪物。每一次游戏的地图都是随机生成的，没有两次冒险会完全相同。",
+            "《星海旅人》是一款开放世界太空探索游戏。驾驶你的飞船穿越上百个星系，与不同的外星文明进行贸易、外交或战争。\n"
+            "你可以自由改装飞船的每一个部件，雇佣船员，并在星球表面建立自己的殖民地。",
+            "一款节奏紧凑的横版动作游戏，手绘画风，配有原创交响乐配乐。游戏包含五个风格迥异的世界、三十多种敌人和十二场首领战。"
+            "通关后将解锁挑战模式和全新的可操作角色。"
+        ]
+    },
+    "en": {
+        "short": [
+            "New Game",
+            "Continue",
+            "Options",
+            "Save and Quit",
+            "Are you sure you want to delete this save?",
+            "Loading...",
+            "Press any key to start",
+            "Achievement unlocked",
+            "Connection lost",
+            "Graphics quality"
+        ],
+        "long": [
+            "A narrative adventure set in a quiet coastal town where the tide has stopped moving. "
+            "Explore hand-painted streets, talk to the townsfolk, and piece together what happened on the night the sea stood still. "
+            "Every conversation matters, and your choices shape which of the six endings you will see.",
+            "Build, manage and defend a colony on a hostile alien planet. Assign colonists to jobs, research new technologies "
+            "and prepare for raids that grow stronger every season. Dynamic weather, a deep crafting system and full mod support "
+            "keep every playthrough different.",
+            "A fast-paced roguelike shooter with procedurally generated dungeons.\n"
+            "Collect hundreds of weapons and upgrades, combine them into absurd builds, and fight your way through ever-changing floors "
+            "alone or with a friend in local co-op.",
+            "Command a fleet of sailing ships in this historical strategy game. Trade goods between ports, negotiate with rival nations, "
+            "and fight tactical naval battles where wind direction and crew morale decide the outcome."
+        ]
+    }
+}
+
+def _benchmark_config(model_dir, language_pairs, texts, backend, batch_size, profile, repeat):
+    """Time one configuration over the corpus, one translate_batch call per batch_size texts"""
+    latencies = []
+    tokens = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for offset in range(0, len(texts), batch_size):
+            chunk = texts[offset:offset + batch_size]
+            request_started = time.perf_counter()
+            results = translate_batch(chunk, model_dir, language_pairs, batch_size=batch_size,
+                                      backend=backend, profile=profile)
+            latencies.append((time.perf_counter() - request_started) * 1000)
+            tokens += sum(result["decoding"]["tokensGenerated"] for result in results)
+    elapsed = time.perf_counter() - started
+    
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "texts": len(texts) * repeat,
+        "latencyMs": {
+            "p50": round(_percentile(latencies, 50), 1),
+            "p95": round(_percentile(latencies, 95), 1),
+            "p99": round(_percentile(latencies, 99), 1),
+            "mean": round(sum(latencies) / len(latencies), 1),
+            "max": round(latencies[-1], 1)
+        },
+        "tokensGenerated": tokens,
+        "tokensPerSecond": round(tokens / elapsed, 1) if elapsed else None,
+        "textsPerSecond": round(len(texts) * repeat / elapsed, 2) if elapsed else None,
+        "peakRssMB": _to_mb(peak_rss_bytes())
+    }
+
+def run_benchmark(args):
+    """Run BENCHMARK_CORPUS through every backend x threads x batch size x profile.
+
+    Returns a JSON-serialisable report. The translation and tokenization
+    caches are disabled so every run measures the tokenizer and the model.
+    coldStart per backend is measured in a fresh process (see
+    measure_cold_start), so every backend pays for interpreter start-up and
+    imports; only the OS page cache may still be warm from earlier backends.
+    peakRssMB of a run is this process's peak so far, so it only grows
+    across runs.
+
+    args is the namespace returned by parse_benchmark_args.
+    """
+    global _tokenization_cache
+    model_dir = args.model_dir
+    language_pairs = args.language_pairs
+    get_cache(model_dir, 0)
+    _tokenization_cache = TokenizationCache(0)
+    
+    texts = [text for lang in ("zh", "en") for kind in ("short", "long") for text in BENCHMARK_CORPUS[lang][kind]]
+    report = {
+        "environment": {
+            "python": sys.version.split()[0],
+            "platform": sys.platform,
+            "cpuCount": os.cpu_count(),
+            "packages": _installed_versions(REQUIRED_PACKAGES + OPTIONAL_PACKAGES)
+        },
+        "corpus": {lang: {kind: len(items) for kind, items in kinds.items()}
+                   for lang, kinds in BENCHMARK_CORPUS.items()},
+        "repeat": args.repeat,
+        "coldStart": {},
+        "runs": []
+    }
+    
+    registry = get_registry(model_dir)
+    for backend in args.backends:
+        report["coldStart"][backend] = measure_cold_start(model_dir, language_pairs, backend, args.profiles[0])
+        if "error" in report["coldStart"][backend]:
+            continue
+        # The runs below share this process, which loads the backend once more
+        registry.evict_all()
+        registry.preload(dict.fromkeys(language_pairs.values()), backend)
+        
+        for threads in args.threads or [None]:
+            if threads:
+                _set_torch_threads(threads)
+            for batch_size in args.batch_sizes:
+                for profile in args.profiles:
+                    run = {"backend": backend, "threads": threads, "batchSize": batch_size, "profile": profile}
+                    print(f"Benchmarking {run}")
+                    try:
+                        run.update(_benchmark_config(model_dir, language_pairs, texts, backend,
+                                                     batch_size, profile, args.repeat))
+                    except Exception as e:
+                        run["error"] = str(e)
+                    report["runs"].append(run)
+    
+    return report
+
+def run_cold_start(model_dir, language_pairs, backend, profile):
+    """Body of the --cold-start child: load both models and translate one string each way"""
+    get_cache(model_dir, 0)
+    get_registry(model_dir).preload(dict.fromkeys(language_pairs.values()), backend)
+    translate_batch([BENCHMARK_CORPUS["zh"]["short"][0], BENCHMARK_CORPUS["en"]["short"][0]],
+                    model_dir, language_pairs, backend=backend, profile=profile)
+    return {"peakRssMB": _to_mb(peak_rss_bytes()), "timings": process_timings()}
+
+def measure_cold_start(model_dir, language_pairs, backend, profile):
+    """Time run_cold_start in a fresh interpreter.
+
+    coldStartMs is wall time from spawning the process until it has answered,
+    so it includes interpreter start-up, the dependency check and the
+    transformers/torch imports; the child's own per-stage timings and peak
+    RSS are reported alongside.
+    """
+    command = [sys.executable, os.path.abspath(__file__), "--cold-start", model_dir,
+               language_pairs["zh-en"], language_pairs["en-zh"], backend, profile]
+    started = time.perf_counter()
+    try:
+        completed = subprocess.run(command, capture_output=True, text=True, encoding='utf-8', timeout=600)
+    except subprocess.TimeoutExpired:
+        return {"error": "Cold start timed out"}
+    cold_start_ms = round((time.perf_counter() - started) * 1000, 1)
+    try:
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        stderr = completed.stderr.strip().splitlines()
+        return {"error": stderr[-1] if stderr else f"Exit code {completed.returncode}"}
+    if "error" in result:
+        return result
+    return dict(result, coldStartMs=cold_start_ms)
+
+def _int_list(value):
+    return [int(item) for item in value.split(",") if item]
+
+def parse_benchmark_args(argv):
+    parser = argparse.ArgumentParser(prog="translate.py --benchmark",
+                                     description="Translation benchmark over a fixed corpus")
+    parser.add_argument("model_dir")
+    parser.add_argument("zh_en_model")
+    parser.add_argument("en_zh_model")
+    parser.add_argument("--backends", default=DEFAULT_BACKEND,
+                        help="Comma-separated backends to compare (%s)" % ", ".join(BACKENDS))
+    parser.add_argument("--batch-sizes", type=_int_list, default=[1, DEFAULT_BATCH_SIZE],
+                        help="Comma-separated batch sizes (texts per request)")
+    parser.add_argument("--profiles", default="fast,%s" % DEFAULT_PROFILE,
+                        help="Comma-separated decoding profiles (%s)" % ", ".join(sorted(DECODING_PROFILES)))
+    parser.add_argument("--threads", type=_int_list, default=[],
+                        help="Comma-separated torch thread counts (default: leave torch's default)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Passes over the corpus per configuration")
+    parser.add_argument("--output", default=None,
+                        help="Also write the JSON report to this file")
+    args = parser.parse_args(argv)
+    
+    args.backends = [backend for backend in args.backends.split(",") if backend]
+    args.profiles = list(dict.fromkeys(profile for profile in args.profiles.split(",") if profile))
+    for backend in args.backends:
+        if backend not in BACKENDS:
+            parser.error(f"Unknown backend: {backend}")
+    for profile in args.profiles:
+        if profile not in DECODING_PROFILES:
+            parser.error(f"Unknown profile: {profile}")
+    if not args.batch_sizes or min(args.batch_sizes) < 1 or args.repeat < 1:
+        parser.error("Batch sizes and --repeat must be positive")
+    args.language_pairs = default_language_pairs(args.zh_en_model, args.en_zh_model)
+    return args
+
+# Records read and translated per step in bulk mode; also the checkpoint interval
+DEFAULT_BULK_CHUNK_SIZE = 64
+BULK_OUTPUT_FIELDS = ["id", "translatedText", "sourceLanguage", "targetLanguage", "error"]
+
+def _bulk_format(path, explicit=None):
+    if explicit:
+        return explicit
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+def read_bulk_records(path, input_format, id_field="id", text_field="text"):
+    """Yield (id, text, error) for every record of a JSONL or CSV file.
+
+    The file is streamed, never loaded whole. Records that can't be used
+    (bad JSON, missing text) come back with an error message instead of text.
+    """
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if input_format == "csv":
+            for number, row in enumerate(csv.DictReader(f), 1):
+                record_id = row.get(id_field) or str(number)
+                text = row.get(text_field)
+                if text is None:
+                    yield record_id, None, f"Missing '{text_field}' column"
+                else:
+                    yield record_id, text, None
+            return
+        
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield str(number), None, f"Invalid JSON: {str(e)}"
+                continue
+            record_id = record.get(id_field, number) if isinstance(record, dict) else number
+            text = record.get(text_field) if isinstance(record, dict) else None
+            if not isinstance(text, str):
+                yield record_id, None, f"Missing '{text_field}'"
+            else:
+                yield record_id, text, None
+
+def _input_fingerprint(path):
+    stat = os.stat(path)
+    return {"input": os.path.abspath(path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+def _read_bulk_checkpoint(checkpoint_path, fingerprint):
+    """Checkpoint of an earlier run over the same, unchanged input, or None"""
+    try:
+        with open(checkpoint_path, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if {key: checkpoint.get(key) for key in fingerprint} != fingerprint:
+        return None
+    return checkpoint
+
+def _write_bulk_checkpoint(checkpoint_path, checkpoint):
+    temp_path = f"{checkpoint_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+    os.replace(temp_path, checkpoint_path)
+
+def run_bulk(args):
+    """Translate every record of a JSONL/CSV file into a JSONL/CSV output file.
+
+    Records are read and translated args.chunk_size at a time, so memory
+    stays bounded whatever the input size. After each chunk the output is
+    flushed and a checkpoint (<output>.checkpoint.json) records how many
+    records and output bytes are done; rerunning the same command resumes
+    from there, dropping any output written after the last checkpoint.
+    Translations also land in the translation cache, so a pre-translated
+    catalogue is served from cache later. Progress and throughput are
+    logged per chunk; the summary dict is returned.
+
+    args is the namespace returned by parse_bulk_args.
+    """
+    input_format = _bulk_format(args.input, args.input_format)
+    output_format = _bulk_format(args.output, args.output_format)
+    checkpoint_path = f"{args.output}.checkpoint.json"
+    fingerprint = _input_fingerprint(args.input)
+    
+    checkpoint = _read_bulk_checkpoint(checkpoint_path, fingerprint) if os.path.exists(args.output) else None
+    if checkpoint:
+        done = checkpoint["records"]
+        # Anything past the checkpoint belongs to a chunk that didn't finish
+        with open(args.output, 'r+b') as f:
+            f.truncate(checkpoint["outputBytes"])
+        print(f"Resuming after {done} records")
+    else:
+        done = 0
+        open(args.output, 'w').close()
+    
+    get_cache(args.model_dir, args.cache_max_mb)
+    pool = None
+    if args.workers > 1:
+        pool = TranslationPool(args.model_dir, args.language_pairs, args.workers, args.threads_per_worker,
+                               args.backend, args.profile, cache_max_mb=args.cache_max_mb)
+    
+    summary = {"records": 0, "resumed": done, "errors": 0, "tokensGenerated": 0}
+    started = time.perf_counter()
+    
+    with open(args.output, 'a', encoding='utf-8', newline='') as out:
+        csv_writer = None
+        if output_format == "csv":
+            csv_writer = csv.DictWriter(out, fieldnames=BULK_OUTPUT_FIELDS, extrasaction='ignore')
+            if out.tell() == 0:
+                csv_writer.writeheader()
+        
+        def write(row):
+            if csv_writer:
+                csv_writer.writerow(row)
+            else:
+                out.write(json.dumps({key: value for key, value in row.items() if value is not None},
+                                     ensure_ascii=False) + "\n")
+        
+        def translate_chunk(chunk):
+            texts = [text for _, text, error in chunk if error is None]
+            if pool:
+                results = pool.translate_batch(texts, args.target)
+            else:
+                results = translate_batch(texts, args.model_dir, args.language_pairs, args.target,
+                                          batch_size=args.batch_size, backend=args.backend, profile=args.profile)
+            results = iter(results)
+            for record_id, _, error in chunk:
+                if error is not None:
+                    summary["errors"] += 1
+                    write({"id": record_id, "error": error})
+                    continue
+                result = next(results)
+                summary["tokensGenerated"] += result["decoding"]["tokensGenerated"]
+                write({
+                    "id": record_id,
+                    "translatedText": result["translatedText"],
+                    "sourceLanguage": result["sourceLanguage"],
+                    "targetLanguage": result["targetLanguage"]
+                })
+            
+            summary["records"] += len(chunk)
+            out.flush()
+            _write_bulk_checkpoint(checkpoint_path, {
+                **fingerprint,
+                "records": done + summary["records"],
+                "outputBytes": out.tell()
+            })
+            
+            elapsed = time.perf_counter() - started
+            print(f"Translated {done + summary['records']} records "
+                  f"({summary['records'] / elapsed:.1f} records/s, "
+                  f"{summary['tokensGenerated'] / elapsed:.1f} tokens/s)")
+        
+        chunk = []
+        records = read_bulk_records(args.input, input_format, args.id_field, args.text_field)
+        for record in itertools.islice(records, done, None):
+            chunk.append(record)
+            if len(chunk) >= args.chunk_size:
+                translate_chunk(chunk)
+                chunk = []
+        if chunk:
+            translate_chunk(chunk)
+    
+    if pool:
+        pool.close()
+    
+    elapsed = time.perf_counter() - started
+    summary.update({
+        "output": os.path.abspath(args.output),
+        "elapsedSeconds": round(elapsed, 2),
+        "recordsPerSecond": round(summary["records"] / elapsed, 2) if elapsed else None,
+        "tokensPerSecond": round(summary["tokensGenerated"] / elapsed, 1) if elapsed else None
+    })
+    return summary
+
+def parse_bulk_args(argv):
+    parser = argparse.ArgumentParser(prog="translate.py --bulk",
+                                     description="Translate a JSONL/CSV file of records with checkpointing")
+    parser.add_argument("input", help="JSONL or CSV file with one record per line/row")
+    parser.add_argument("output", help="JSONL or CSV file to write results to")
+    parser.add_argument("model_dir")
+    parser.add_argument("zh_en_model")
+    parser.add_argument("en_zh_model")
+    parser.add_argument("--input-format", choices=("jsonl", "csv"), default=None,
+                        help="Input format (default: from the file extension)")
+    parser.add_argument("--output-format", choices=("jsonl", "csv"), default=None,
+                        help="Output format (default: from the file extension)")
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--text-field", default="text")
+    parser.add_argument("--target", default=None,
+                        help="Target language for every record (default: opposite of the detected language)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_BULK_CHUNK_SIZE,
+                        help="Records per translate step and checkpoint")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND)
+    parser.add_argument("--profile", choices=sorted(DECODING_PROFILES), default=DEFAULT_PROFILE)
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_CACHE_MAX_MB,
+                        help="Size limit of the persistent translation cache, 0 disables it")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes (1 = translate in-process)")
+    parser.add_argument("--threads-per-worker", type=int, default=None)
+    args = parser.parse_args(argv)
+    
+    if args.chunk_size < 1 or args.batch_size < 1:
+        parser.error("--chunk-size and --batch-size must be positive")
+    args.language_pairs = default_language_pairs(args.zh_en_model, args.en_zh_model)
+    return args
+
+def partial_event(segment_index, segment, translation, text_index=None):
+    """Streaming event for one translated segment"""
+    event = {
+        "event": "partial",
+        "index": segment_index,
+        "start": segment.start,
+        "end": segment.end,
+        "paragraph": segment.paragraph,
+        "translation": translation
+    }
+    if text_index is not None:
+        event["textIndex"] = text_index
+    return event
+
+def parse_server_args(argv):
+    parser = argparse.ArgumentParser(prog="translate.py --server", description="Long-lived translation worker")
+    parser.add_argument("model_dir")
+    parser.add_argument("zh_en_model")
+    parser.add_argument("en_zh_model")
+    parser.add_argument("--model-memory-mb", type=float, default=DEFAULT_MODEL_MEMORY_MB,
+                        help="Memory budget for resident models before LRU eviction")
+    parser.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND,
+                        help="Default inference backend; requests may override it with \"backend\"")
+    parser.add_argument("--profile", choices=sorted(DECODING_PROFILES), default=DEFAULT_PROFILE,
+                        help="Default decoding profile; requests may override it with \"profile\"")
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_CACHE_MAX_MB,
+                        help="Size limit of the persistent translation cache, 0 disables it")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes for translate_batch requests (1 = translate in-process)")
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="Torch intra-op threads per worker (default: (cores - 1) / workers)")
+    parser.add_argument("--pair", action="append", default=[], metavar="SRC-TGT=MODEL",
+                        help="Extra language pair to serve, e.g. en-ja=Helsinki-NLP/opus-mt-en-jap")
+    parser.add_argument("--batch-window-ms", type=float, default=DEFAULT_BATCH_WINDOW_MS,
+                        help="How long to wait for concurrent requests to merge into one batch (0 = no wait)")
+    parser.add_argument("--trace-file", default=TRACE_FILE,
+                        help="Write per-stage timings to this file in Chrome trace format")
+    parser.add_argument("--calibrate", choices=("auto", "always", "never"), default="auto",
+                        help=f"Time candidate torch thread counts at startup: auto = only without a saved "
+                             f"{RUNTIME_PROFILE_FILE} for this machine")
+    args = parser.parse_args(argv)
+    
+    args.language_pairs = default_language_pairs(args.zh_en_model, args.en_zh_model)
+    for pair in args.pair:
+        key, sep, model_name = pair.partition("=")
+        if not sep or "-" not in key or not model_name:
+            parser.error(f"Invalid --pair value: {pair}")
+        args.language_pairs[key] = model_name
+    return args
+
+# Concurrent translate requests arriving within this window (ms) are merged
+# into one translate_batch call, and identical texts among them are
+# translated once
+DEFAULT_BATCH_WINDOW_MS = 5
+MAX_COALESCED_REQUESTS = 64
+
+# Scheduling priorities, lower runs first. Interactive work (text the user
+# is looking at) goes ahead of background batches such as search result
+# descriptions. ping/stats/shutdown jump the queue; end of input comes last.
+PRIORITIES = {"interactive": 0, "normal": 1, "background": 2}
+CONTROL_PRIORITY = -1
+END_PRIORITY = sys.maxsize
+
+class RequestQueue:
+    """Priority queue of pending server requests.
+
+    Lower priority values are served first, in arrival order within one
+    priority. Ids of queued or running requests are tracked so cancel() can
+    flag them; the flag is checked before a request reaches generate and
+    while it is decoding.
+    """
+    
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._active = set()
+        self._cancelled = set()
+    
+    def put(self, priority, request_id, item):
+        with self._condition:
+            if request_id is not None:
+                self._active.add(request_id)
+            heapq.heappush(self._heap, (priority, next(self._counter), item))
+            self._condition.notify()
+    
+    def get(self, timeout=None, priority=None):
+        """Pop the most urgent item as (priority, item).
+
+        With priority given only an item of exactly that priority is
+        returned; waiting ends with queue.Empty after timeout seconds or as
+        soon as something more urgent is queued.
+        """
+        with self._condition:
+            ready = lambda: self._heap and (priority is None or self._heap[0][0] <= priority)
+            if not self._condition.wait_for(ready, timeout):
+                raise queue.Empty
+            if priority is not None and self._heap[0][0] != priority:
+                raise queue.Empty
+            item_priority, _, item = heapq.heappop(self._heap)
+            return item_priority, item
+    
+    def cancel(self, request_id):
+        """Flag a queued or running request; False if it is unknown or already done"""
+        with self._condition:
+            if request_id not in self._active:
+                return False
+            self._cancelled.add(request_id)
+            return True
+    
+    def is_cancelled(self, request_id):
+        with self._condition:
+            return request_id in self._cancelled
+    
+    def done(self, request_id):
+        with self._condition:
+            self._active.discard(request_id)
+            self._cancelled.discard(request_id)
+    
+    def stats(self):
+        with self._condition:
+            return {"queued": len(self._heap), "active": len(self._active), "cancelled": len(self._cancelled)}
+
+def _validate_request(request, op):
+    if request.get("priority", "normal") not in PRIORITIES:
+        raise ValueError(f"Unknown priority: {request.get('priority')}")
+    if op == "translate" and not isinstance(request.get("text"), str):
+        raise ValueError("Request is missing 'text'")
+    if op == "translate_batch":
+        texts = request.get("texts")
+        if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+            raise ValueError("Request is missing 'texts'")
+
+def coalesce_requests(requests, default_backend=DEFAULT_BACKEND, default_profile=DEFAULT_PROFILE):
+    """Group translate/translate_batch requests that can share one translate_batch call.
+
+    Requests are grouped by (target, backend, profile, latency_budget_ms).
+    Returns an OrderedDict mapping that key to a list of
+    (request id, op, texts) in arrival order.
+    """
+    groups = OrderedDict()
+    for request in requests:
+        op = request.get("op", "translate")
+        texts = [request["text"]] if op == "translate" else request["texts"]
+        settings = (request.get("target"), request.get("backend", default_backend),
+                    request.get("profile", default_profile), request.get("latency_budget_ms"))
+        groups.setdefault(settings, []).append((request.get("id"), op, texts))
+    return groups
+
+def run_server(args):
+    """Long-lived translation worker.
+
+    Reads newline-delimited JSON requests from stdin, e.g.
+    {"id": 1, "text": "...", "target": "en"}, and writes one JSON line per
+    request to stdout carrying the same id. Models are loaded once and kept
+    in a ModelRegistry, so every request after the first only pays for
+    inference. Log output goes to stderr to keep stdout a clean response
+    channel.
+
+    Optional request fields: "target" (defaults to the opposite of the
+    detected language), "backend", "profile", "latency_budget_ms", and
+    "stream", which emits a "partial" event line per translated segment
+    before the final response. {"op": "translate_batch", "texts": [...]}
+    translates a list in one go and answers with "results" in the same
+    order; with --workers > 1 (and no per-request overrides) batches are
+    spread over a TranslationPool. {"op": "ping"}, {"op": "stats"} and
+    {"op": "shutdown"} are also understood; the server exits on shutdown or
+    when stdin is closed.
+
+    Non-streaming requests that arrive within --batch-window-ms of each
+    other (or queue up while a batch is being translated) are coalesced:
+    requests with the same settings share one translate_batch call, and a
+    text requested several times is translated once for all of them.
+
+    Requests may carry "priority" ("interactive", "normal" or "background")
+    and "deadline_ms" (relative to arrival). Queued work is served most
+    urgent first. {"op": "cancel", "target_id": <id>} flags a queued or
+    running request: it is answered with {"error": "Cancelled", "cancelled":
+    true}, and requests past their deadline with {"expired": true}. Neither
+    reaches generate, and a batch whose requests are all cancelled or
+    expired stops decoding early. Batches handed to the worker pool can
+    only be dropped before dispatch.
+
+    At startup torch is configured from the saved runtime profile (see
+    apply_runtime_profile); without one, --calibrate auto times a few thread
+    counts once and saves the fastest for later starts.
+
+    args is the namespace returned by parse_server_args.
+    """
+    model_dir = args.model_dir
+    language_pairs = args.language_pairs
+    backend = args.backend
+    profile = args.profile
+    enable_trace_file(args.trace_file)
+    timing_stats = TimingAggregator()
+    
+    # Responses come from the scheduler and from the stdin reader (cancel)
+    respond_lock = threading.Lock()
+    
+    def respond(payload):
+        with respond_lock:
+            _response_stream.write(json.dumps(payload, ensure_ascii=False) + "\n")
+            _response_stream.flush()
+    
+    print(f"Model directory: {model_dir}")
+    for pair, model_name in language_pairs.items():
+        print(f"Model for {pair}: {model_name}")
+    
+    # Load every configured model up front so the first request doesn't pay for it
+    registry = get_registry(model_dir, args.model_memory_mb)
+    runtime = apply_runtime_profile(model_dir) if backend != "onnx" else None
+    registry.preload(dict.fromkeys(language_pairs.values()), backend)
+    # Calibration runs inference, so it has to happen before any pool is forked;
+    # with a pool the workers split the cores between them instead
+    if runtime is not None and args.workers <= 1 and (
+            args.calibrate == "always" or (args.calibrate == "auto" and not runtime["calibrated"])):
+        with trace_stage("calibration"):
+            calibrate_runtime(model_dir, language_pairs, backend)
+    
+    # Start the pool before the first request runs any inference in this process
+    pool = None
+    if args.workers > 1:
+        pool = TranslationPool(model_dir, language_pairs, args.workers, args.threads_per_worker, backend, profile,
+                               cache_max_mb=args.cache_max_mb, model_memory_mb=args.model_memory_mb)
+    get_cache(model_dir, args.cache_max_mb)
+    
+    respond({"event": "ready", "timings": process_timings()})
+    
+    coalescing = {"requests": 0, "batches": 0, "texts": 0, "uniqueTexts": 0}
+    dropped = {"cancelled": 0, "expired": 0}
+    pending = RequestQueue()
+    
+    def expired(deadline):
+        return deadline is not None and time.monotonic() >= deadline
+    
+    def drop_reason(request_id, deadline):
+        if pending.is_cancelled(request_id):
+            return "cancelled"
+        if expired(deadline):
+            return "expired"
+        return None
+    
+    def respond_dropped(request_id, reason):
+        dropped[reason] += 1
+        if reason == "cancelled":
+            respond({"id": request_id, "error": "Cancelled", "cancelled": True})
+        else:
+            respond({"id": request_id, "error": "Deadline exceeded", "expired": True})
+    
+    def run_group(settings, members):
+        """Translate every distinct text of a coalesced group once and answer each waiter"""
+        target, request_backend, request_profile, latency_budget_ms = settings
+        unique_texts = list(dict.fromkeys(text for _, _, texts in members for text in texts))
+        coalescing["requests"] += len(members)
+        coalescing["batches"] += 1
+        coalescing["texts"] += sum(len(texts) for _, _, texts in members)
+        coalescing["uniqueTexts"] += len(unique_texts)
+        if len(members) > 1:
+            print(f"Coalesced {len(members)} requests into one batch of {len(unique_texts)} texts")
+        
+        # The shared batch only stops once none of its requests still wants it
+        def should_stop():
+            return all(drop_reason(request_id, deadlines.get(request_id)) for request_id, _, _ in members)
+        
+        try:
+            # Plain batches go to the worker pool when there is one
+            if pool and (request_backend, request_profile, latency_budget_ms) == (backend, profile, None):
+                results = pool.translate_batch(unique_texts, target)
+                # Each pool chunk is timed separately in its worker
+                for timings in {id(result["timings"]): result["timings"] for result in results}.values():
+                    timing_stats.add(timings)
+            else:
+                results = translate_batch(unique_texts, model_dir, language_pairs, target,
+                                          backend=request_backend, profile=request_profile,
+                                          latency_budget_ms=latency_budget_ms, should_stop=should_stop)
+                if results:
+                    timing_stats.add(results[0]["timings"])
+        except TranslationCancelled:
+            for request_id, _, _ in members:
+                respond_dropped(request_id, drop_reason(request_id, deadlines.get(request_id)))
+            return
+        except Exception as e:
+            for request_id, _, _ in members:
+                respond({"id": request_id, "error": str(e)})
+            return
+        
+        by_text = dict(zip(unique_texts, results))
+        for request_id, op, texts in members:
+            if pending.is_cancelled(request_id):
+                respond_dropped(request_id, "cancelled")
+            elif op == "translate":
+                respond({"id": request_id, **by_text[texts[0]]})
+            else:
+                respond({"id": request_id, "results": [by_text[text] for text in texts]})
+    
+    def flush(batch):
+        for settings, members in coalesce_requests(batch, backend, profile).items():
+            run_group(settings, members)
+        batch.clear()
+    
+    def handle_request(request, deadline):
+        """Handle a request that can't be coalesced; returns False on shutdown"""
+        request_id = request.get("id")
+        op = request.get("op", "translate")
+        
+        if op == "shutdown":
+            respond({"id": request_id, "event": "shutdown"})
+            return False
+        if op == "ping":
+            respond({"id": request_id, "event": "pong"})
+            return True
+        if op == "stats":
+            cache = get_cache(model_dir)
+            respond({
+                "id": request_id,
+                "registry": registry.stats(),
+                "cache": cache.stats() if cache else None,
+                "pool": pool.stats() if pool else None,
+                "timings": timing_stats.stats(),
+                "startup": process_timings(),
+                "coalescing": dict(coalescing),
+                "tokenization": _tokenization_cache.stats(),
+                "runtime": _runtime_profile,
+                "queue": {**pending.stats(), "dropped": dict(dropped)}
+            })
+            return True
+        
+        def should_stop():
+            return drop_reason(request_id, deadline) is not None
+        
+        try:
+            if op == "translate_batch":
+                # Streaming batch: partial events are tied to this request's text indexes
+                def on_segment(text_index, segment_index, segment, translation):
+                    respond({"id": request_id, **partial_event(segment_index, segment, translation, text_index)})
+                
+                results = translate_batch(request["texts"], model_dir, language_pairs, request.get("target"),
+                                          backend=request.get("backend", backend),
+                                          profile=request.get("profile", profile),
+                                          latency_budget_ms=request.get("latency_budget_ms"),
+                                          on_segment=on_segment, should_stop=should_stop)
+                if results:
+                    timing_stats.add(results[0]["timings"])
+                respond({"id": request_id, "results": results})
+                return True
+            
+            def on_partial(event):
+                respond({"id": request_id, **event})
+            
+            result = handle_translation(request["text"], model_dir, language_pairs, request.get("target"),
+                                        request.get("backend", backend), request.get("profile", profile),
+                                        request.get("latency_budget_ms"), on_partial, should_stop)
+        except TranslationCancelled:
+            respond_dropped(request_id, drop_reason(request_id, deadline))
+            return True
+        timing_stats.add(result["timings"])
+        respond({"id": request_id, **result})
+        return True
+    
+    # Absolute deadlines of queued and running requests, by id
+    deadlines = {}
+    
+    def process(items):
+        """Handle one window of same-priority requests in arrival order; returns False to stop.
+
+        Cancelled and expired requests are answered without translating.
+        Non-streaming translations are collected and coalesced; any other
+        request first flushes what was collected so responses keep their order
+        relative to it.
+        """
+        batch = []
+        try:
+            for item in items:
+                if item is None:
+                    flush(batch)
+                    return False
+                
+                request, deadline = item
+                request_id = request.get("id")
+                try:
+                    op = request.get("op", "translate")
+                    _validate_request(request, op)
+                    
+                    reason = drop_reason(request_id, deadline)
+                    if reason:
+                        respond_dropped(request_id, reason)
+                        continue
+                    
+                    if op in ("translate", "translate_batch") and not request.get("stream"):
+                        deadlines[request_id] = deadline
+                        batch.append(request)
+                        continue
+                    
+                    flush(batch)
+                    if not handle_request(request, deadline):
+                        return False
+                except Exception as e:
+                    respond({"id": request_id, "error": str(e)})
+            flush(batch)
+            return True
+        finally:
+            for item in items:
+                if item is not None:
+                    request_id = item[0].get("id")
+                    deadlines.pop(request_id, None)
+                    pending.done(request_id)
+    
+    # stdin is read on its own thread so requests keep arriving while the
+    # model is busy: cancels take effect at once, everything else is queued
+    # by priority and handled in windows
+    def read_requests():
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except Exception as e:
+                respond({"id": None, "error": str(e)})
+                continue
+            
+            request_id = request.get("id") if isinstance(request, dict) else None
+            try:
+                op = request.get("op", "translate")
+                if op == "cancel":
+                    cancelled = pending.cancel(request.get("target_id"))
+                    respond({"id": request_id, "event": "cancel", "cancelled": cancelled})
+                    continue
+                
+                if op in ("ping", "stats", "shutdown"):
+                    priority = CONTROL_PRIORITY
+                else:
+                    priority = PRIORITIES.get(request.get("priority", "normal"), PRIORITIES["normal"])
+                deadline = None
+                if request.get("deadline_ms") is not None:
+                    deadline = time.monotonic() + float(request["deadline_ms"]) / 1000
+            except Exception as e:
+                respond({"id": request_id, "error": str(e)})
+                continue
+            pending.put(priority, request_id, (request, deadline))
+        pending.put(END_PRIORITY, None, None)
+    
+    threading.Thread(target=read_requests, name="stdin-reader", daemon=True).start()
+    
+    window = args.batch_window_ms / 1000
+    running = True
+    while running:
+        priority, item = pending.get()
+        items = [item]
+        # Micro-batching window: give concurrent callers of the same priority
+        # a moment to queue up; anything more urgent ends the window early
+        window_end = time.monotonic() + window
+        while item is not None and len(items) < MAX_COALESCED_REQUESTS:
+            try:
+                _, item = pending.get(max(0, window_end - time.monotonic()), priority)
+            except queue.Empty:
+                break
+            items.append(item)
+        running = process(items)
+    
+    if pool:
+        pool.close()
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--doctor":
+        if len(sys.argv) < 3:
+            print(json.dumps({"error": "Not enough parameters"}, ensure_ascii=False), flush=True)
+            sys.exit(1)
+        
+        report = run_doctor(sys.argv[2])
+        print(json.dumps(report, ensure_ascii=False), flush=True)
+        sys.exit(0 if report["ok"] else 1)
+    
+    if len(sys.argv) > 1 and sys.argv[1] == "--convert-safetensors":
+        if len(sys.argv) < 4:
+            print(json.dumps({"error": "Not enough parameters"}, ensure_ascii=False), flush=True)
+            sys.exit(1)
+        
+        converted = {}
+        for model_name in sys.argv[3:]:
+            try:
+                converted[model_name] = convert_to_safetensors(sys.argv[2], model_name)
+            except Exception as e:
+                converted[model_name] = {"error": str(e)}
+        print(json.dumps({"converted": converted}, ensure_ascii=False), flush=True)
+        sys.exit(0 if all(isinstance(path, str) for path in converted.values()) else 1)
+    
+    if len(sys.argv) > 1 and sys.argv[1] == "--benchmark":
+        benchmark_args = parse_benchmark_args(sys.argv[2:])
+        report = run_benchmark(benchmark_args)
+        report_json = json.dumps(report, ensure_ascii=False, indent=2)
+        if benchmark_args.output:
+            with open(benchmark_args.output, 'w', encoding='utf-8') as f:
+                f.write(report_json)
+        _response_stream.write(report_json + "\n")
+        _response_stream.flush()
+        sys.exit(0)
+    
+    if len(sys.argv) > 1 and sys.argv[1] == "--cold-start":
+        # Child process of measure_cold_start
+        try:
+            result = run_cold_start(sys.argv[2], default_language_pairs(sys.argv[3], sys.argv[4]),
+                                    sys.argv[5], sys.argv[6])
+        except Exception as e:
+            result = {"error": str(e)}
+        _response_stream.write(json.dumps(result, ensure_ascii=False) + "\n")
+        _response_stream.flush()
+        sys.exit(0 if "error" not in result else 1)
+    
+    if len(sys.argv) > 1 and sys.argv[1] == "--bulk":
+        try:
+            summary = run_bulk(parse_bulk_args(sys.argv[2:]))
+        except Exception as e:
+            _response_stream.write(json.dumps({"error": str(e)}, ensure_ascii=False) + "\n")
+            _response_stream.flush()
+            sys.exit(1)
+        _response_stream.write(json.dumps(summary, ensure_ascii=False) + "\n")
+        _response_stream.flush()
+        sys.exit(0)
+    
+    if len(sys.argv) > 1 and sys.argv[1] == "--server":
+        if len(sys.argv) < 5:
+            print(json.dumps({"error": "Not enough parameters"}, ensure_ascii=False), flush=True)
+            sys.exit(1)
+        
+        run_server(parse_server_args(sys.argv[2:]))
+        sys.exit(0)
+    
     if len(sys.argv) < 4:
         print(json.dumps({"error": "Not enough parameters"}, ensure_ascii=False), flush=True)
         sys.exit(1)
@@ -121,21 +2509,19 @@ if __name__ == "__main__":
         print(f"Chinese to English model: {zh_en_model}")
         print(f"English to Chinese model: {en_zh_model}")
         
-        # Detect language and choose appropriate model
-        lang = detect_language(text)
-        model_name = zh_en_model if lang == "zh" else en_zh_model
+        # --stream prints one JSON line per translated segment as soon as it is ready
+        on_partial = None
+        if "--stream" in sys.argv[5:]:
+            def on_partial(event):
+                print(json.dumps(event, ensure_ascii=False), flush=True)
         
-        print(f"Detected language: {lang}, using model: {model_name}")
+        enable_trace_file(TRACE_FILE)
         
         # Translate text
-        translated_text = translate_text(text, model_dir, model_name)
-        
-        # Output JSON format result
-        result = {
-            "translatedText": translated_text,
-            "sourceLanguage": lang,
-            "targetLanguage": "en" if lang == "zh" else "zh"
-        }
+        language_pairs = default_language_pairs(zh_en_model, en_zh_model)
+        result = handle_translation(text, model_dir, language_pairs, on_partial=on_partial)
+        # A one-shot run also pays for startup; report it next to the request stages
+        result["timings"] = {"process": process_timings(), **result["timings"]}
         
         # 单独输出JSON结果，确保使用UTF-8编码，并清空输出缓冲区
         result_json = json.dumps(result, ensure_ascii=False)
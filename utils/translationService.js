@@ -35,6 +35,10 @@ class TranslationService extends EventEmitter {
     this.translateScriptPath = path.join(__dirname, 'translate.py');
     this.downloadScriptPath = path.join(__dirname, 'download_model.py');
     
+    // 常驻翻译进程（translate.py --server），首次翻译时启动
+    this.useTranslationServer = true;
+    this._translationServer = null;
+    
     // 自动检查和安装模型
     this.autoCheckAndInstall();
   }
@@ -671,16 +675,18 @@ if __name__ == "__main__":
             this._checkModelExists().then(exists => {
               if (exists) {
                 console.log('模型文件验证成功');
-                this.isModelReady = true;
-                
-                // 发射成功事件 - 确保只有在真正完成时才报告100%
-                this.emit('download-progress', {
-                  stage: 'completed',
-                  currentModelName: '备用下载完成，模型验证成功',
-                  percentage: 100
+                return this._runTranslationDoctor(pythonCmd).then(() => {
+                  this.isModelReady = true;
+                  
+                  // 发射成功事件 - 确保只有在真正完成时才报告100%
+                  this.emit('download-progress', {
+                    stage: 'completed',
+                    currentModelName: '备用下载完成，模型验证成功',
+                    percentage: 100
+                  });
+                  
+                  resolve(true);
                 });
-                
-                resolve(true);
               } else {
                 console.error('模型文件验证失败');
                 
@@ -754,7 +760,8 @@ if __name__ == "__main__":
   }
   
   // 翻译文本
-  async translateText(text) {
+  // onPartial(partial)在常驻翻译进程每译好一段时调用（流式翻译），可以不传
+  async translateText(text, onPartial = null) {
     return new Promise((resolve, reject) => {
       // 检查模型是否准备好
       if (!this.isModelReady) {
@@ -799,164 +806,184 @@ if __name__ == "__main__":
           
           console.log(`使用Python命令: ${pythonCmd}`);
           
-          // 构建模型目录路径
-          const modelDir = this.modelDir;
-          const zhEnModel = this.modelName;
-          const enZhModel = this.reverseModelName;
-          
-          // 构建命令行参数
-          const cmdArgs = [
-            scriptPath,
-            text,
-            modelDir,
-            zhEnModel,
-            enZhModel
-          ];
-          
-          // 记录完整命令行
-          console.log('执行翻译命令:', `"${pythonCmd}" "${cmdArgs.join('" "')}"`);
-          
-          // 使用spawn执行Python脚本，确保指定编码为utf8
-          const process = spawn(pythonCmd, cmdArgs, { encoding: 'utf8' });
-          
-          let stdoutData = '';
-          let stderrData = '';
-          
-          // 收集标准输出
-          process.stdout.on('data', (data) => {
-            // 确保使用UTF-8编码解析Buffer
-            const chunk = Buffer.isBuffer(data) ? data.toString('utf8') : data.toString();
-            console.log(`翻译进程输出: ${chunk}`);
-            stdoutData += chunk;
-          });
+          // 单次进程模式：每次翻译启动一个新的Python进程
+          const translateOnce = () => {
+            // 构建模型目录路径
+            const modelDir = this.modelDir;
+            const zhEnModel = this.modelName;
+            const enZhModel = this.reverseModelName;
+          
+            // 构建命令行参数
+            const cmdArgs = [
+              scriptPath,
+              text,
+              modelDir,
+              zhEnModel,
+              enZhModel
+            ];
+          
+            // 记录完整命令行
+            console.log('执行翻译命令:', `"${pythonCmd}" "${cmdArgs.join('" "')}"`);
+          
+            // 使用spawn执行Python脚本，确保指定编码为utf8
+            const process = spawn(pythonCmd, cmdArgs, { encoding: 'utf8' });
+          
+            let stdoutData = '';
+            let stderrData = '';
+          
+            // 收集标准输出
+            process.stdout.on('data', (data) => {
+              // 确保使用UTF-8编码解析Buffer
+              const chunk = Buffer.isBuffer(data) ? data.toString('utf8') : data.toString();
+              console.log(`翻译进程输出: ${chunk}`);
+              stdoutData += chunk;
+            });
           
-          // 收集错误输出
-          process.stderr.on('data', (data) => {
-            const chunk = Buffer.isBuffer(data) ? data.toString('utf8') : data.toString();
-            console.error(`翻译进程错误: ${chunk}`);
-            stderrData += chunk;
-          });
+            // 收集错误输出
+            process.stderr.on('data', (data) => {
+              const chunk = Buffer.isBuffer(data) ? data.toString('utf8') : data.toString();
+              console.error(`翻译进程错误: ${chunk}`);
+              stderrData += chunk;
+            });
           
-          // 处理进程结束
-          process.on('close', (code) => {
-            console.log(`翻译进程退出，代码: ${code}`);
+            // 处理进程结束
+            process.on('close', (code) => {
+              console.log(`翻译进程退出，代码: ${code}`);
             
-            if (code !== 0) {
-              console.error(`翻译进程异常退出，错误信息: ${stderrData}`);
-              reject(new Error(`翻译失败，退出代码 ${code}: ${stderrData}`));
-              return;
-            }
+              if (code !== 0) {
+                console.error(`翻译进程异常退出，错误信息: ${stderrData}`);
+                reject(new Error(`翻译失败，退出代码 ${code}: ${stderrData}`));
+                return;
+              }
             
-            try {
-              // 先尝试查找标记的JSON结果
-              const startMarker = "--- TRANSLATION RESULT JSON BEGIN ---";
-              const endMarker = "--- TRANSLATION RESULT JSON END ---";
+              try {
+                // 先尝试查找标记的JSON结果
+                const startMarker = "--- TRANSLATION RESULT JSON BEGIN ---";
+                const endMarker = "--- TRANSLATION RESULT JSON END ---";
               
-              const startIndex = stdoutData.indexOf(startMarker);
-              const endIndex = stdoutData.indexOf(endMarker);
+                const startIndex = stdoutData.indexOf(startMarker);
+                const endIndex = stdoutData.indexOf(endMarker);
               
-              if (startIndex !== -1 && endIndex !== -1 && endIndex > startIndex) {
-                // 提取标记之间的JSON文本
-                const jsonText = stdoutData.substring(startIndex + startMarker.length, endIndex).trim();
-                console.log('找到标记的JSON结果:', jsonText);
+                if (startIndex !== -1 && endIndex !== -1 && endIndex > startIndex) {
+                  // 提取标记之间的JSON文本
+                  const jsonText = stdoutData.substring(startIndex + startMarker.length, endIndex).trim();
+                  console.log('找到标记的JSON结果:', jsonText);
                 
-                try {
-                  const result = JSON.parse(jsonText);
-                  console.log('成功解析标记的JSON结果:', result);
+                  try {
+                    const result = JSON.parse(jsonText);
+                    console.log('成功解析标记的JSON结果:', result);
                   
-                  resolve({
-                    translatedText: String(result.translatedText || ''),
-                    sourceLanguage: result.sourceLanguage || 'unknown',
-                    targetLanguage: result.targetLanguage || 'unknown'
-                  });
-                  return;
-                } catch (err) {
-                  console.error('解析标记的JSON失败:', err, '原始内容:', jsonText);
-                  // 继续尝试其他方法
+                    resolve({
+                      translatedText: String(result.translatedText || ''),
+                      sourceLanguage: result.sourceLanguage || 'unknown',
+                      targetLanguage: result.targetLanguage || 'unknown'
+                    });
+                    return;
+                  } catch (err) {
+                    console.error('解析标记的JSON失败:', err, '原始内容:', jsonText);
+                    // 继续尝试其他方法
+                  }
                 }
-              }
               
-              // 如果没有找到标记的JSON，尝试其他解析方法
-              let jsonResult = null;
-              const lines = stdoutData.split('\n');
+                // 如果没有找到标记的JSON，尝试其他解析方法
+                let jsonResult = null;
+                const lines = stdoutData.split('\n');
               
-              console.log('尝试行解析，输出行数:', lines.length);
+                console.log('尝试行解析，输出行数:', lines.length);
               
-              for (const line of lines) {
-                if (line.trim().startsWith('{') && line.trim().endsWith('}')) {
-                  try {
-                    const parsed = JSON.parse(line.trim());
-                    // 如果包含翻译结果或错误，这可能是我们要找的JSON
-                    if (parsed.translatedText || parsed.error) {
-                      jsonResult = parsed;
-                      console.log('行解析成功找到JSON结果');
-                      break;
+                for (const line of lines) {
+                  if (line.trim().startsWith('{') && line.trim().endsWith('}')) {
+                    try {
+                      const parsed = JSON.parse(line.trim());
+                      // 如果包含翻译结果或错误，这可能是我们要找的JSON
+                      if (parsed.translatedText || parsed.error) {
+                        jsonResult = parsed;
+                        console.log('行解析成功找到JSON结果');
+                        break;
+                      }
+                    } catch (e) {
+                      // 不是有效的JSON，继续查找
                     }
-                  } catch (e) {
-                    // 不是有效的JSON，继续查找
                   }
                 }
-              }
               
-              if (jsonResult) {
-                if (jsonResult.error) {
-                  reject(new Error(jsonResult.error));
-                } else {
-                  console.log('翻译结果:', jsonResult);
-                  // 确保translatedText是字符串
-                  if (jsonResult.translatedText === null || jsonResult.translatedText === undefined) {
-                    jsonResult.translatedText = '翻译失败';
-                  }
+                if (jsonResult) {
+                  if (jsonResult.error) {
+                    reject(new Error(jsonResult.error));
+                  } else {
+                    console.log('翻译结果:', jsonResult);
+                    // 确保translatedText是字符串
+                    if (jsonResult.translatedText === null || jsonResult.translatedText === undefined) {
+                      jsonResult.translatedText = '翻译失败';
+                    }
                   
-                  resolve({
-                    translatedText: String(jsonResult.translatedText),
-                    sourceLanguage: jsonResult.sourceLanguage,
-                    targetLanguage: jsonResult.targetLanguage
-                  });
-                }
-              } else {
-                console.error('无法从翻译进程输出中解析JSON结果，原始输出:', stdoutData);
+                    resolve({
+                      translatedText: String(jsonResult.translatedText),
+                      sourceLanguage: jsonResult.sourceLanguage,
+                      targetLanguage: jsonResult.targetLanguage
+                    });
+                  }
+                } else {
+                  console.error('无法从翻译进程输出中解析JSON结果，原始输出:', stdoutData);
                 
-                // 尝试使用正则表达式直接提取JSON
-                const jsonRegex = /{[\s\S]*?}/;
-                const match = stdoutData.match(jsonRegex);
-                if (match) {
-                  try {
-                    const extractedJson = JSON.parse(match[0]);
-                    console.log('使用正则表达式成功提取JSON:', extractedJson);
+                  // 尝试使用正则表达式直接提取JSON
+                  const jsonRegex = /{[\s\S]*?}/;
+                  const match = stdoutData.match(jsonRegex);
+                  if (match) {
+                    try {
+                      const extractedJson = JSON.parse(match[0]);
+                      console.log('使用正则表达式成功提取JSON:', extractedJson);
                     
-                    if (extractedJson.translatedText) {
-                      resolve({
-                        translatedText: String(extractedJson.translatedText),
-                        sourceLanguage: extractedJson.sourceLanguage || 'unknown',
-                        targetLanguage: extractedJson.targetLanguage || 'unknown'
-                      });
-                      return;
+                      if (extractedJson.translatedText) {
+                        resolve({
+                          translatedText: String(extractedJson.translatedText),
+                          sourceLanguage: extractedJson.sourceLanguage || 'unknown',
+                          targetLanguage: extractedJson.targetLanguage || 'unknown'
+                        });
+                        return;
+                      }
+                    } catch (e) {
+                      console.error('使用正则表达式提取JSON失败:', e);
                     }
-                  } catch (e) {
-                    console.error('使用正则表达式提取JSON失败:', e);
                   }
-                }
                 
-                // 如果无法提取JSON，返回原始文本作为备选
-                console.warn('无法提取JSON，使用原始输出作为结果');
-                resolve({
-                  translatedText: stdoutData.trim() || '翻译结果解析失败',
-                  sourceLanguage: 'unknown',
-                  targetLanguage: 'unknown'
-                });
+                  // 如果无法提取JSON，返回原始文本作为备选
+                  console.warn('无法提取JSON，使用原始输出作为结果');
+                  resolve({
+                    translatedText: stdoutData.trim() || '翻译结果解析失败',
+                    sourceLanguage: 'unknown',
+                    targetLanguage: 'unknown'
+                  });
+                }
+              } catch (error) {
+                console.error('处理翻译结果时出错:', error);
+                reject(error);
               }
-            } catch (error) {
-              console.error('处理翻译结果时出错:', error);
+            });
+          
+            // 处理进程错误
+            process.on('error', (error) => {
+              console.error('启动翻译进程时出错:', error);
               reject(error);
-            }
-          });
+            });
+          };
           
-          // 处理进程错误
-          process.on('error', (error) => {
-            console.error('启动翻译进程时出错:', error);
-            reject(error);
-          });
+          // 优先使用常驻翻译进程（模型只加载一次），不可用时回退到单次进程模式
+          if (this.useTranslationServer) {
+            this._translateWithServer(pythonCmd, scriptPath, text, onPartial)
+              .then(resolve)
+              .catch(error => {
+                if (error.isServerFailure) {
+                  console.warn('常驻翻译进程不可用，回退到单次进程模式:', error.message);
+                  this.useTranslationServer = false;
+                  translateOnce();
+                } else {
+                  reject(error);
+                }
+              });
+          } else {
+            translateOnce();
+          }
         }).catch(error => {
           console.error('检测Python命令时出错:', error);
           reject(error);
@@ -973,6 +1000,183 @@ if __name__ == "__main__":
     });
   }
   
+  // 获取常驻翻译进程，不存在或已退出时启动新进程
+  _getTranslationServer(pythonCmd, scriptPath) {
+    if (this._translationServer && !this._translationServer.exited) {
+      return this._translationServer;
+    }
+    
+    const args = [scriptPath, '--server', this.modelDir, this.modelName, this.reverseModelName];
+    console.log('启动常驻翻译进程:', `"${pythonCmd}" "${args.join('" "')}"`);
+    
+    const child = spawn(pythonCmd, args, {
+      env: { ...process.env, PYTHONIOENCODING: 'utf-8' }
+    });
+    const server = {
+      process: child,
+      pending: new Map(),
+      nextId: 1,
+      buffer: '',
+      exited: false
+    };
+    
+    // 标准输出每行一个JSON响应，按id分发给等待中的请求
+    child.stdout.on('data', (data) => {
+      server.buffer += Buffer.isBuffer(data) ? data.toString('utf8') : data.toString();
+      
+      let newlineIndex;
+      while ((newlineIndex = server.buffer.indexOf('\n')) !== -1) {
+        const line = server.buffer.slice(0, newlineIndex).trim();
+        server.buffer = server.buffer.slice(newlineIndex + 1);
+        if (!line) continue;
+        
+        let message;
+        try {
+          message = JSON.parse(line);
+        } catch (e) {
+          console.log(`翻译进程输出: ${line}`);
+          continue;
+        }
+        
+        // 流式请求的分段结果，最终结果仍会单独返回
+        if (message.event === 'partial') {
+          const streaming = server.pending.get(message.id);
+          if (streaming && streaming.onPartial) {
+            streaming.onPartial(message);
+          }
+          continue;
+        }
+        
+        const waiter = server.pending.get(message.id);
+        if (!waiter) continue;
+        server.pending.delete(message.id);
+        
+        if (message.error) {
+          waiter.reject(new Error(message.error));
+        } else {
+          waiter.resolve(message);
+        }
+      }
+    });
+    
+    // 标准错误是Python端的日志
+    child.stderr.on('data', (data) => {
+      const chunk = Buffer.isBuffer(data) ? data.toString('utf8') : data.toString();
+      console.log(`翻译进程日志: ${chunk}`);
+    });
+    
+    // 进程退出时让所有等待中的请求失败，下次翻译会重新启动进程
+    const fail = (error) => {
+      if (server.exited) return;
+      server.exited = true;
+      error.isServerFailure = true;
+      for (const waiter of server.pending.values()) {
+        waiter.reject(error);
+      }
+      server.pending.clear();
+      if (this._translationServer === server) {
+        this._translationServer = null;
+      }
+    };
+    
+    child.on('close', (code) => {
+      console.log(`常驻翻译进程退出，代码: ${code}`);
+      fail(new Error(`常驻翻译进程退出，代码 ${code}`));
+    });
+    child.on('error', (error) => {
+      console.error('启动常驻翻译进程时出错:', error);
+      fail(error);
+    });
+    child.stdin.on('error', (error) => {
+      console.error('写入常驻翻译进程时出错:', error);
+      fail(error);
+    });
+    
+    this._translationServer = server;
+    return server;
+  }
+  
+  // 向常驻翻译进程发送一个请求，返回对应id的原始响应；流式请求的分段结果交给onPartial
+  _requestTranslationServer(pythonCmd, scriptPath, payload, onPartial = null) {
+    return new Promise((resolve, reject) => {
+      const server = this._getTranslationServer(pythonCmd, scriptPath);
+      const id = server.nextId++;
+      
+      server.pending.set(id, { resolve, reject, onPartial });
+      server.process.stdin.write(JSON.stringify({ ...payload, id }) + '\n');
+    });
+  }
+  
+  // 将Python端的单条翻译结果整理为统一格式
+  _normalizeTranslationResult(result) {
+    return {
+      translatedText: String(result.translatedText || ''),
+      sourceLanguage: result.sourceLanguage || 'unknown',
+      targetLanguage: result.targetLanguage || 'unknown'
+    };
+  }
+  
+  // 通过常驻翻译进程翻译文本，用户直接请求的翻译优先处理；传入onPartial时按分段流式返回
+  async _translateWithServer(pythonCmd, scriptPath, text, onPartial = null) {
+    const payload = { text, priority: 'interactive' };
+    if (onPartial) {
+      payload.stream = true;
+    }
+    const message = await this._requestTranslationServer(pythonCmd, scriptPath, payload, onPartial);
+    return this._normalizeTranslationResult(message);
+  }
+  
+  // 批量翻译文本，结果顺序与输入一致
+  async translateBatch(texts) {
+    if (!this.isModelReady) {
+      throw new Error('翻译模型未准备好，请稍后再试');
+    }
+    
+    if (texts.length === 0) {
+      return [];
+    }
+    
+    // 常驻翻译进程可以一次处理整批文本
+    if (this.useTranslationServer && fs.existsSync(this.translateScriptPath)) {
+      const pythonCmd = await this._detectPythonCommand();
+      if (pythonCmd) {
+        try {
+          const message = await this._requestTranslationServer(pythonCmd, this.translateScriptPath, {
+            op: 'translate_batch',
+            texts,
+            // 批量翻译（如搜索结果描述）在后台进行，不阻塞交互翻译
+            priority: 'background'
+          });
+          return message.results.map(result => this._normalizeTranslationResult(result));
+        } catch (error) {
+          if (!error.isServerFailure) {
+            throw error;
+          }
+          console.warn('常驻翻译进程不可用，改为逐条翻译:', error.message);
+        }
+      }
+    }
+    
+    // 回退：逐条翻译
+    const results = [];
+    for (const text of texts) {
+      results.push(await this.translateText(text));
+    }
+    return results;
+  }
+  
+  // 关闭常驻翻译进程
+  stopTranslationServer() {
+    const server = this._translationServer;
+    if (!server || server.exited) return;
+    
+    try {
+      server.process.stdin.end(JSON.stringify({ op: 'shutdown' }) + '\n');
+    } catch (e) {
+      server.process.kill();
+    }
+  }
+  
   // 确保模型目录存在
   _ensureModelDir() {
     if (!fs.existsSync(this.modelDir)) {
@@ -2004,6 +2208,10 @@ if __name__ == "__main__":
         
         let stdoutData = '';
         let stderrData = '';
+        // 一次data事件可能只包含半行，未结束的行留到下次拼接后再解析
+        let pendingLine = '';
+        // 两个模型同时下载、各自报告进度，按模型记录后取平均，进度条才不会在两个模型之间来回跳
+        const modelProgress = { [this.modelName]: 0, [this.reverseModelName]: 0 };
         
         // 获取标准输出
         downloadProcess.stdout.on('data', (data) => {
@@ -2012,8 +2220,9 @@ if __name__ == "__main__":
               
               // 尝试解析JSON进度信息
               try {
-            // 分割输出，处理可能的多行JSON
-            const lines = text.split('\n');
+            // 按完整的行解析，最后一段可能还没有输出完
+            const lines = (pendingLine + text).split('\n');
+            pendingLine = lines.pop();
             
             for (const line of lines) {
               const trimmedLine = line.trim();
@@ -2024,6 +2233,13 @@ if __name__ == "__main__":
                 try {
                   const jsonData = JSON.parse(trimmedLine);
                   
+                  // 下载结束时的汇总（字节数、耗时、每个文件的速度），只记录不作为进度
+                  if (jsonData && jsonData.summary) {
+                    this.lastDownloadSummary = jsonData.summary;
+                    console.log('下载汇总:', JSON.stringify(jsonData.summary));
+                    continue;
+                  }
+                  
                   // 检查是否是进度信息
                   if (jsonData && (jsonData.stage || jsonData.percentage !== undefined || jsonData.model)) {
                     // 创建标准化的进度对象
@@ -2080,12 +2296,23 @@ if __name__ == "__main__":
                     // 保存当前阶段用于后续判断
                     this._currentDownloadStage = stage;
                     
+                    // 换算成两个模型的整体进度（单个模型的进度不会倒退）
+                    if (stage !== 'error' && Object.prototype.hasOwnProperty.call(modelProgress, modelName)) {
+                      modelProgress[modelName] = Math.max(modelProgress[modelName], displayPercentage);
+                      const values = Object.values(modelProgress);
+                      displayPercentage = Math.round(values.reduce((sum, value) => sum + value, 0) / values.length);
+                    }
+                    
                     // 创建干净的进度对象
                     const progress = {
                       stage: stage,
                       currentModelName: displayName,
                       percentage: displayPercentage
                     };
+                    // 下载速度、剩余时间和重试次数
+                    if (jsonData.metrics) {
+                      progress.metrics = jsonData.metrics;
+                    }
                     
                     // 更新最后进度时间和百分比
                     lastProgressTime = Date.now();
@@ -2134,6 +2361,7 @@ if __name__ == "__main__":
               if (exists) {
                 // 模型文件下载成功
                 console.log('模型文件验证成功');
+                return this._runTranslationDoctor(pythonCmd).then(() => {
                     this.isModelReady = true;
                     
                 // 更新下载进度为完成
@@ -2145,6 +2373,7 @@ if __name__ == "__main__":
                 this.emit('download-progress', this.downloadProgress);
                     
                     resolve(true);
+                });
         } else {
                 // 模型文件不完整
                 console.error('模型文件不完整，下载可能失败');
@@ -2224,6 +2453,53 @@ if __name__ == "__main__":
     });
   }
   
+  // 模型下载完成后检查一次Python依赖并写入环境标记（translate.py --doctor），
+  // 这样首次翻译时不需要再检查或安装依赖。失败不影响下载结果，首次翻译时会再检查
+  _runTranslationDoctor(pythonCmd) {
+    return new Promise((resolve) => {
+      if (!fs.existsSync(this.translateScriptPath)) {
+        resolve(false);
+        return;
+      }
+      
+      this.emit('download-progress', {
+        stage: 'verifying',
+        currentModelName: '检查翻译运行环境',
+        percentage: 99
+      });
+      
+      const args = [this.translateScriptPath, '--doctor', this.modelDir];
+      console.log('检查翻译运行环境:', `"${pythonCmd}" "${args.join('" "')}"`);
+      
+      let stdoutData = '';
+      const doctorProcess = spawn(pythonCmd, args, {
+        env: { ...process.env, PYTHONIOENCODING: 'utf-8' }
+      });
+      
+      doctorProcess.stdout.on('data', (data) => {
+        stdoutData += Buffer.isBuffer(data) ? data.toString('utf8') : data.toString();
+      });
+      
+      doctorProcess.stderr.on('data', (data) => {
+        console.log(`环境检查输出: ${Buffer.isBuffer(data) ? data.toString('utf8') : data.toString()}`);
+      });
+      
+      doctorProcess.on('close', (code) => {
+        if (code === 0) {
+          console.log('翻译运行环境检查通过');
+        } else {
+          console.warn(`翻译运行环境检查失败，退出码: ${code}`, stdoutData.trim());
+        }
+        resolve(code === 0);
+      });
+      
+      doctorProcess.on('error', (error) => {
+        console.warn('无法启动翻译运行环境检查:', error.message);
+        resolve(false);
+      });
+    });
+  }
+  
   // 解析下载进度信息
   _parseDownloadProgress(progressData) {
     try {